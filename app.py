@@ -1,12 +1,20 @@
 from dash import Dash
 
+import config
 from callbacks import register_callbacks
 from components.layout import create_layout
+from utils.instrumentation import register_metrics
+from utils.uploads import register_upload_routes
 
 app = Dash(__name__, suppress_callback_exceptions=True)
 app.title = "CSV/Excel Визуализатор"
 app.layout = create_layout()
 register_callbacks(app)
+register_upload_routes(app)
+register_metrics(app)
+
+# WSGI-приложение для gunicorn: gunicorn app:server (см. gunicorn.conf.py)
+server = app.server
 
 if __name__ == '__main__':
-    app.run(debug=True, port=8050)
\ No newline at end of file
+    app.run(debug=config.DEBUG, port=config.PORT)
\ No newline at end of file
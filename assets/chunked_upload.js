@@ -0,0 +1,100 @@
+// Загрузка больших файлов кусками через /upload в обход dcc.Upload (base64 внутри JSON).
+// Прерванная загрузка того же файла продолжается с места, до которого дошёл сервер.
+(function () {
+    var MAX_RETRIES = 5;
+
+    function uploadUrl(uploadId) {
+        var config = JSON.parse(document.getElementById('_dash-config').textContent);
+        return config.requests_pathname_prefix + 'upload/' + encodeURIComponent(uploadId);
+    }
+
+    // Идентификатор загрузки стабилен для одного и того же файла — это и делает её возобновляемой
+    function uploadIdFor(file) {
+        return [file.size, file.lastModified, file.name].join('-')
+            .replace(/[^A-Za-z0-9_-]/g, '_').slice(0, 128);
+    }
+
+    function setStatus(text) {
+        window.dash_clientside.set_props('large-upload-status', {children: text});
+    }
+
+    function sleep(ms) {
+        return new Promise(function (resolve) { setTimeout(resolve, ms); });
+    }
+
+    async function requestJson(url, options) {
+        var response = await fetch(url, options);
+        var body = await response.json().catch(function () { return {}; });
+        return {status: response.status, ok: response.ok, body: body};
+    }
+
+    async function sendChunks(url, file, chunkBytes) {
+        var offset = (await requestJson(url)).body.offset || 0;
+        var retries = 0;
+        while (offset < file.size) {
+            var result;
+            try {
+                result = await requestJson(url, {
+                    method: 'PUT',
+                    headers: {'Upload-Offset': String(offset)},
+                    body: file.slice(offset, offset + chunkBytes)
+                });
+            } catch (error) {
+                // Обрыв связи: ждём и продолжаем с того места, что успел сохранить сервер
+                if (++retries > MAX_RETRIES) {
+                    throw error;
+                }
+                await sleep(1000 * retries);
+                offset = (await requestJson(url)).body.offset || 0;
+                continue;
+            }
+            if (result.status === 409) {
+                offset = result.body.offset;
+                continue;
+            }
+            if (!result.ok) {
+                throw new Error(result.body.error || ('HTTP ' + result.status));
+            }
+            retries = 0;
+            offset = result.body.offset;
+            setStatus('Загружено ' + Math.floor(100 * offset / file.size) + '%');
+        }
+    }
+
+    async function upload(file, chunkBytes) {
+        var url = uploadUrl(uploadIdFor(file));
+        try {
+            await sendChunks(url, file, chunkBytes);
+            setStatus('Файл загружен, идёт разбор…');
+            var result = await requestJson(url + '/complete', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({filename: file.name})
+            });
+            if (!result.ok) {
+                throw new Error(result.body.error || ('HTTP ' + result.status));
+            }
+            setStatus('');
+            window.dash_clientside.set_props('large-upload-result', {data: {dataset_id: result.body.dataset_id}});
+        } catch (error) {
+            setStatus('Ошибка загрузки: ' + error.message);
+        }
+    }
+
+    // Кнопка создаётся Dash после загрузки скрипта, поэтому клик ловим делегированием
+    document.addEventListener('click', function (event) {
+        var button = event.target.closest('#large-upload-button');
+        if (!button) {
+            return;
+        }
+        var input = document.createElement('input');
+        input.type = 'file';
+        input.accept = '.csv,.xls,.xlsx';
+        input.addEventListener('change', function () {
+            if (input.files.length) {
+                upload(input.files[0], parseInt(button.dataset.chunkBytes, 10));
+            }
+        });
+        input.click();
+    });
+})();
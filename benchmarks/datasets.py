@@ -0,0 +1,87 @@
+"""Синтетические наборы данных для бенчмарков: детерминированные, кэшируются на диске."""
+import os
+
+import numpy as np
+import pandas as pd
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# В листе Excel не больше 1 048 576 строк — книги генерируются только для размеров до 1M
+XLSX_MAX_ROWS = 1_048_576
+XLSX_COLUMNS = ['x', 'y', 'value', 'category', 'date']
+CHUNK_ROWS = 1_000_000
+
+COUNTRIES = ['Russia', 'Germany', 'France', 'Italy', 'Spain', 'Poland', 'Brazil', 'Canada',
+             'Japan', 'China', 'India', 'Mexico', 'Egypt', 'Kenya', 'Chile', 'Norway']
+WORDS = np.array(['alpha', 'beta', 'gamma', 'delta', 'omega', 'sigma', 'kappa', 'lambda'])
+
+
+def make_frame(n_rows: int, seed=0) -> pd.DataFrame:
+    """
+    Колонки покрывают все типы графиков: ряд x/y, числовые value/size, категории,
+    источник/цель для Санкея, страны, даты, OHLC для свечей и Task/Start/Finish для Ганта.
+    Текстовая колонка comment — последняя: в неё склеиваются лишние поля битых строк.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(n_rows).cumsum() * 0.1
+    spread = rng.random(n_rows)
+    start = pd.Timestamp('2020-01-01') + pd.to_timedelta(np.arange(n_rows), unit='min')
+    return pd.DataFrame({
+        'x': np.arange(n_rows, dtype=np.float64),
+        'y': rng.standard_normal(n_rows).cumsum(),
+        'value': rng.gamma(2.0, 10.0, n_rows),
+        'size': rng.random(n_rows) * 50,
+        'category': rng.choice([f'cat{i:02d}' for i in range(50)], n_rows),
+        'source': rng.choice([f'src{i}' for i in range(10)], n_rows),
+        'target': rng.choice([f'dst{i}' for i in range(10)], n_rows),
+        'country': rng.choice(COUNTRIES, n_rows),
+        'date': start,
+        'open': close - spread,
+        'high': close + spread,
+        'low': close - 2 * spread,
+        'close': close,
+        'Task': rng.choice([f'task{i}' for i in range(20)], n_rows),
+        'Start': start,
+        'Finish': start + pd.Timedelta(minutes=30),
+        'comment': pd.Series(WORDS[rng.integers(0, len(WORDS), n_rows)]),
+    })
+
+
+def _malformed_csv(path, frame: pd.DataFrame, seed=0):
+    """CSV, где в 1% строк в тексте неэкранированная запятая — как в реальных выгрузках."""
+    rng = np.random.default_rng(seed)
+    broken = rng.random(len(frame)) < 0.01
+    comment = np.where(broken, frame['comment'] + '; ' + frame['comment'], frame['comment'])
+    # pandas экранировал бы запятую кавычками, поэтому ставим ';' и заменяем её в готовом тексте
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(frame), CHUNK_ROWS):
+            part = frame.iloc[start:start + CHUNK_ROWS].assign(comment=comment[start:start + CHUNK_ROWS])
+            f.write(part.to_csv(index=False, header=start == 0).replace(';', ','))
+
+
+def dataset_kinds(size: str) -> list:
+    """Какие файлы есть у набора: csv — корректный CSV, malformed — с битыми строками, xlsx — книга."""
+    return ['csv', 'malformed'] + (['xlsx'] if SIZES[size] <= XLSX_MAX_ROWS else [])
+
+
+def dataset_path(data_dir: str, size: str, kind: str) -> str:
+    """Путь к файлу набора; при первом обращении файл генерируется."""
+    extension = 'xlsx' if kind == 'xlsx' else 'csv'
+    suffix = '_malformed' if kind == 'malformed' else ''
+    path = os.path.join(data_dir, f'bench_{size}{suffix}.{extension}')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(data_dir, exist_ok=True)
+    print(f"Генерация {os.path.basename(path)} ({SIZES[size]} строк)...")
+    frame = make_frame(SIZES[size])
+    tmp_path = f"{path}.tmp.{extension}"
+    if kind == 'csv':
+        frame.to_csv(tmp_path, index=False)
+    elif kind == 'malformed':
+        _malformed_csv(tmp_path, frame)
+    else:
+        frame[XLSX_COLUMNS].to_excel(tmp_path, index=False)
+    # Прерванная генерация не оставляет недописанный файл
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,254 @@
+"""
+Бенчмарки разбора файлов, построения графиков и аналитики на синтетических данных.
+
+Для каждого случая замеряются время (лучшее из --repeat запусков), пик прироста RSS
+и размер JSON фигуры. С --baseline результаты сравниваются с сохранённым базовым
+прогоном: если случай стал медленнее, прожорливее или фигура тяжелее больше чем на
+--tolerance, скрипт завершается с ошибкой.
+
+    python -m benchmarks.run [--sizes 10k,1m,10m] [--only graph] [--repeat 3]
+    python -m benchmarks.run --save-baseline       # записать базовый прогон
+    python -m benchmarks.run --baseline            # сравнить с ним
+
+Наборы данных генерируются при первом обращении и лежат в --data-dir.
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+from benchmarks.datasets import SIZES, dataset_kinds, dataset_path, make_frame
+from components.layout import graph_types
+from utils.analytics.anomaly import detect_anomalies
+from utils.analytics.clustering import cluster_data
+from utils.data_processing import _parse_decoded, parse_csv_with_commas, process_uploaded_file
+from utils.figures import build_figure
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'visualcsv-bench')
+
+# Оси для каждого типа графика (x, y, z) — как их выбрал бы пользователь
+GRAPH_AXES = {
+    'bar': ('category', 'value', None),
+    'line': ('x', 'y', None),
+    'pie': ('category', 'value', None),
+    'scatter': ('x', 'y', None),
+    'histogram': ('value', None, None),
+    'box': ('category', 'value', None),
+    'heatmap': ('x', 'y', None),
+    'candlestick': ('date', 'close', None),
+    'bubble': ('x', 'y', 'size'),
+    'sankey': ('source', 'target', None),
+    'choropleth': ('country', 'value', None),
+    'gantt': ('Task', 'Start', None),
+    'combo': ('x', 'y', None),
+}
+
+# Ниже этих порогов разница считается шумом измерений
+MIN_SECONDS_DELTA = 0.05
+MIN_PEAK_MB_DELTA = 10.0
+MIN_FIGURE_KB_DELTA = 1.0
+
+MB = 1024 ** 2
+
+
+class PeakRSS:
+    """
+    Пик прироста RSS за время блока (опрос в фоновом потоке). Учитываются и дочерние
+    процессы: кластеризация и прогноз считают в пулах процессов.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak_bytes = 0
+
+    def _rss(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass  # процесс успел завершиться
+        return rss
+
+    def __enter__(self):
+        self.baseline = self.peak = self._rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak, self._rss()) - self.baseline
+
+
+def _data_url(path, mime):
+    with open(path, 'rb') as f:
+        return f"data:{mime};base64," + base64.b64encode(f.read()).decode('ascii')
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _figure_case(graph_type):
+    x, y, z = GRAPH_AXES[graph_type]
+
+    def run(df):
+        # Как в update_graph: построение фигуры и её сериализация для отправки в браузер
+        return build_figure(df, graph_type, x, y, z).to_json()
+    return run
+
+
+def collect_cases(size, data_dir):
+    """
+    Случаи для набора size: {имя: (подготовка, замеряемая функция)}.
+    Подготовка (чтение файла, разбор DataFrame) в замер не входит, её результат передаётся функции.
+    """
+    def path(kind):
+        return dataset_path(data_dir, size, kind)
+
+    loaded = {}
+
+    def frame():
+        # DataFrame после настоящего разбора загрузки — с теми же типами, что в приложении
+        if 'df' not in loaded:
+            loaded['df'], _ = _parse_decoded('csv', path('csv'))
+        return loaded['df']
+
+    cases = {
+        'process_uploaded_file/csv': (lambda: _data_url(path('csv'), 'text/csv'), process_uploaded_file),
+        'parse_csv_with_commas': (lambda: _read_bytes(path('malformed')), parse_csv_with_commas),
+    }
+    if 'xlsx' in dataset_kinds(size):
+        mime = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        cases['process_uploaded_file/xlsx'] = (lambda: _data_url(path('xlsx'), mime), process_uploaded_file)
+
+    for option in graph_types:
+        graph_type = option['value']
+        if graph_type not in GRAPH_AXES:
+            print(f"Внимание: для графика {graph_type} не заданы оси, он не замеряется")
+            continue
+        cases[f'update_graph/{graph_type}'] = (frame, _figure_case(graph_type))
+
+    cases['detect_anomalies'] = (frame, lambda df: detect_anomalies(df, ['value', 'y']))
+    cases['cluster_data'] = (frame, lambda df: cluster_data(df, ['value', 'size']))
+    return cases
+
+
+def warm_up():
+    """Первое построение фигуры plotly подгружает валидаторы и шаблоны — не относим это к случаю."""
+    df = make_frame(100)
+    for graph_type, (x, y, z) in GRAPH_AXES.items():
+        build_figure(df, graph_type, x, y, z).to_json()
+
+
+def measure(setup, run, repeat):
+    """Лучшее время из repeat запусков, пик памяти и размер JSON фигуры (если run вернул JSON)."""
+    argument = setup()
+    best = float('inf')
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        with PeakRSS() as rss:
+            started = time.perf_counter()
+            result = run(argument)
+            best = min(best, time.perf_counter() - started)
+        peak = max(peak, rss.peak_bytes)
+    metrics = {'seconds': round(best, 4), 'peak_mb': round(peak / MB, 1)}
+    if isinstance(result, str):
+        metrics['figure_kb'] = round(len(result.encode('utf-8')) / 1024, 1)
+    return metrics
+
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно базового прогона."""
+    limits = (('seconds', MIN_SECONDS_DELTA, 'с'), ('peak_mb', MIN_PEAK_MB_DELTA, 'МБ'),
+              ('figure_kb', MIN_FIGURE_KB_DELTA, 'КБ'))
+    regressions = []
+    for case, metrics in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        for metric, min_delta, unit in limits:
+            if metric not in metrics or metric not in base:
+                continue
+            value, reference = metrics[metric], base[metric]
+            if value > reference * (1 + tolerance) and value - reference > min_delta:
+                regressions.append(f"{case}: {metric} {reference} -> {value} {unit}")
+    return regressions
+
+
+def _print_row(case, metrics, base):
+    def cell(metric):
+        value = metrics.get(metric)
+        if value is None:
+            return '-'
+        if base and base.get(metric):
+            return f"{value} ({value / base[metric]:.2f}x)"
+        return str(value)
+    print(f"{case:<40}{cell('seconds'):>18}{cell('peak_mb'):>18}{cell('figure_kb'):>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки разбора, графиков и аналитики")
+    parser.add_argument('--sizes', default='10k', help=f"размеры наборов через запятую: {', '.join(SIZES)}")
+    parser.add_argument('--only', default='', help="замерять только случаи, в имени которых есть подстрока")
+    parser.add_argument('--repeat', type=int, default=3, help="сколько раз запускать каждый случай")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="каталог сгенерированных наборов")
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help="сравнить с базовым прогоном (по умолчанию benchmarks/baseline.json)")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help="сохранить результаты как базовый прогон")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="допустимое ухудшение, доля")
+    parser.add_argument('--output', help="записать результаты в JSON")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    warm_up()
+    print(f"{'случай':<40}{'время, с':>18}{'пик RSS, МБ':>18}{'JSON фигуры, КБ':>20}")
+    results = {}
+    for size in args.sizes.split(','):
+        for name, (setup, run) in collect_cases(size, args.data_dir).items():
+            case = f"{size}/{name}"
+            if args.only not in case:
+                continue
+            results[case] = measure(setup, run, args.repeat)
+            _print_row(case, results[case], baseline.get(case))
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"Результаты записаны в {path}")
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Ошибка: регрессии относительно {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,16 @@
+import dash
 from dash import dash_table, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-from utils.data_processing import process_uploaded_file
+from utils.data_processing import load_dataset
+from utils.column_profile import axis_options, columns_of_kind, dataset_profile
+from utils.crossfilter import active_filters, crossfilter_mask, filters_key
+from utils.dataset_cache import dataset_cache, get_dataframe, make_dataset_handle
+from utils.instrumentation import instrument_callback, record_error, record_rows, stage
+from utils.table_query import get_page
+
+PREVIEW_PAGE_SIZE = 10
 
 
 def register_data_callbacks(app):
@@ -15,35 +23,117 @@ def register_data_callbacks(app):
          Output('stored-data', 'data'),
          Output('x-axis', 'options'),
          Output('y-axis', 'options'),
-         Output('z-axis', 'options')],
-        [Input('upload-data', 'contents')],
+         Output('z-axis', 'options'),
+         Output('excel-sheet', 'options'),
+         Output('excel-sheet', 'value'),
+         Output('excel-sheet', 'style')],
+        [Input('upload-data', 'contents'),
+         Input('large-upload-result', 'data'),
+         Input('excel-sheet', 'value')],
         prevent_initial_call=True
     )
-    def update_data_display(contents):
+    @instrument_callback
+    def update_data_display(contents, large_upload, sheet_dataset_id):
         """
         Обрабатывает загруженные данные и обновляет интерфейс.
+        Файл приходит либо из dcc.Upload, либо уже разобранным через загрузку кусками
+        (тогда в large_upload только идентификатор датасета в кэше). Для книги Excel
+        каждый лист — отдельный датасет, смена листа в excel-sheet переключает датасет.
         Возвращает:
         - Таблицу с данными
-        - Данные в формате словаря для хранения
+        - Идентификатор датасета в серверном кэше и его схему
         - Опции для осей X, Y, Z
+        - Список листов книги, выбранный лист и видимость выбора листа
         """
-        if not contents:
+        trigger = dash.callback_context.triggered_id
+        value = {'large-upload-result': large_upload, 'excel-sheet': sheet_dataset_id}.get(trigger, contents)
+        if not value:
             raise PreventUpdate
 
         try:
-            df = process_uploaded_file(contents)
-            options = [{'label': col, 'value': col} for col in df.columns]
+            if trigger == 'upload-data':
+                dataset_id, df = load_dataset(contents)
+            else:
+                dataset_id = value if trigger == 'excel-sheet' else value['dataset_id']
+                df = get_dataframe(dataset_id)
+            record_rows(len(df))
+            profile = dataset_profile(dataset_id, df)
+            options = axis_options(profile)
+            # Ось Z — размер пузырьков, имеет смысл только для чисел
+            numeric = set(columns_of_kind(profile, 'numeric'))
+            z_options = [option for option in options if option['value'] in numeric]
 
+            # В браузер уходит только первая страница, остальные отдаёт update_table_page
+            with stage('query'):
+                data, page_count = get_page(dataset_id, df, 0, PREVIEW_PAGE_SIZE)
             table = dash_table.DataTable(
-                data=df.to_dict('records'),
+                id='preview-table',
+                data=data,
                 columns=[{'name': col, 'id': col} for col in df.columns],
-                page_size=10,
+                page_current=0,
+                page_size=PREVIEW_PAGE_SIZE,
+                page_count=page_count,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
                 style_table={'overflowX': 'auto'}
             )
 
-            # Возвращаем таблицу, данные и опции для осей
-            return table, df.to_dict('records'), options, options, options
+            # Возвращаем таблицу, описание датасета и опции для осей
+            result = (table, make_dataset_handle(dataset_id, df, profile), options, options, z_options)
+            if trigger == 'excel-sheet':
+                return result + (dash.no_update, dash.no_update, dash.no_update)
+            sheets = (dataset_cache.get_meta(dataset_id) or {}).get('sheets') or []
+            style = {'width': '100%', 'margin': '10px 0', 'display': 'block' if len(sheets) > 1 else 'none'}
+            return result + (sheets, dataset_id if sheets else None, style)
 
         except Exception as e:
+            record_error()
             # Возвращаем ошибку и пустые списки
-            return html.Div(f"Ошибка: {str(e)}"), None, [], [], []
+            return html.Div(f"Ошибка: {str(e)}"), None, [], [], [], [], None, {'display': 'none'}
+
+    @app.callback(
+        [Output('preview-table', 'data'),
+         Output('preview-table', 'page_count'),
+         Output('preview-table', 'page_current')],
+        [Input('preview-table', 'page_current'),
+         Input('preview-table', 'page_size'),
+         Input('preview-table', 'sort_by'),
+         Input('preview-table', 'filter_query'),
+         Input('crossfilter', 'data')],
+        [State('stored-data', 'data')],
+        prevent_initial_call=True
+    )
+    @instrument_callback
+    def update_table_page(page_current, page_size, sort_by, filter_query, crossfilter, stored_data):
+        """
+        Серверная пагинация, сортировка и фильтрация таблицы предпросмотра.
+        Показываются только строки, отобранные перекрёстным фильтром графиков.
+        Возвращает только видимую страницу.
+        """
+        if not stored_data:
+            raise PreventUpdate
+
+        dataset_id = stored_data['dataset_id']
+        # Новый отбор строк начинается с первой страницы
+        if dash.callback_context.triggered_id == 'crossfilter':
+            page_current = 0
+        try:
+            with stage('load'):
+                df = get_dataframe(dataset_id)
+            record_rows(len(df))
+            conditions = active_filters(crossfilter, dataset_id)
+            with stage('crossfilter'):
+                row_mask = crossfilter_mask(dataset_id, df, conditions)
+            with stage('query'):
+                data, page_count = get_page(dataset_id, df, page_current, page_size, sort_by, filter_query,
+                                            row_mask, filters_key(conditions))
+            return data, page_count, page_current
+
+        except Exception:
+            # Например, фильтр, несовместимый с типом колонки, — показываем пустую страницу
+            record_error()
+            return [], 1, 0
@@ -1,12 +1,78 @@
 import dash
-import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-from utils.data_processing import process_uploaded_file, detect_anomalies, forecast_time_series, cluster_data
+from components.layout import graph_types
+from utils.column_profile import axis_options, columns_of_kind, recommend_graph_types
+from utils.crossfilter import (active_filters, apply_crossfilter, condition_columns, crossfilter_mask, filters_key,
+                               selection_conditions)
+from utils.dataset_cache import get_dataframe
+from utils.decimation import is_zoom_event, parse_x_range
+from utils.figure_cache import figure_cache
+from utils.figures import ZOOMABLE_GRAPH_TYPES, FigureError, build_figure, figure_columns
+from utils.instrumentation import instrument_callback, record_error, record_rows, stage
+from utils.jobs import background_manager, run_analysis
+
+# Колонка с большей долей различных значений не предлагается для группировки прогноза
+GROUP_MAX_DISTINCT_RATIO = 0.5
+
+# Графики, выделение на которых фильтрует данные остальных: id графика -> id его настроек
+CROSSFILTER_GRAPHS = {
+    'graph': ('graph-type', 'x-axis', 'y-axis'),
+    'linked-graph': ('linked-graph-type', 'linked-x-axis', 'linked-y-axis'),
+}
+
+
+def _zoom_range(trigger_id, graph_id, graph_type, relayout_data):
+    """Видимый диапазон X после приближения; PreventUpdate, если событие не требует перестроения."""
+    if trigger_id != graph_id:
+        return None
+    if graph_type not in ZOOMABLE_GRAPH_TYPES or not is_zoom_event(relayout_data):
+        raise PreventUpdate
+    return parse_x_range(relayout_data)
+
+
+def _load_columns(stored_data, columns, conditions):
+    """
+    Строки датасета только с колонками графика и условий фильтра (columns=None — все колонки):
+    без датасета в памяти с диска или из книги Excel читаются только они.
+    """
+    if columns is None:
+        return get_dataframe(stored_data['dataset_id'])
+    names = set(stored_data.get('columns') or [])
+    needed = [col for col in dict.fromkeys(columns + condition_columns(conditions)) if col in names]
+    return get_dataframe(stored_data['dataset_id'], needed or None)
+
+
+def render_graph(graph_id, graph_type, x_axis, y_axis, z_axis, stored_data, crossfilter, x_range=None):
+    """
+    Фигура графика graph_id по строкам, отобранным выделениями на остальных графиках.
+    Сброс фильтра меняет uirevision — с графиков снимаются выделения и масштаб.
+    """
+    dataset_id = stored_data['dataset_id']
+    conditions = active_filters(crossfilter, dataset_id, exclude=graph_id)
+    revision = crossfilter.get('revision', 0) if crossfilter and crossfilter.get('dataset_id') == dataset_id else 0
+
+    # Возврат к уже построенному виду не пересчитывает фигуру
+    cache_key = figure_cache.make_key(dataset_id, graph_type, x_axis, y_axis, z_axis, x_range,
+                                      f"{filters_key(conditions)}:{revision}")
+    fig = figure_cache.get(cache_key)
+    if fig is None:
+        with stage('load'):
+            df = _load_columns(stored_data, figure_columns(graph_type, x_axis, y_axis, z_axis,
+                                                           stored_data.get('profile')), conditions)
+        with stage('crossfilter'):
+            df = apply_crossfilter(dataset_id, df, conditions)
+        record_rows(len(df))
+        with stage('figure'):
+            fig = build_figure(df, graph_type, x_axis, y_axis, z_axis, x_range, stored_data.get('profile'))
+        # Масштаб сохраняется при перестроении, пока не сменились данные, тип графика или оси
+        fig.update_layout(uirevision=f"{dataset_id}:{graph_type}:{x_axis}:{y_axis}:{z_axis}:{revision}")
+        with stage('serialize'):
+            figure_cache.put(cache_key, fig)
+    return fig
 
 
 def register_graph_callbacks(app):
@@ -19,41 +85,173 @@ def register_graph_callbacks(app):
         [Input('apply-ai-button', 'n_clicks')],
         [State('ai-analysis-type', 'value'),
          State('anomaly-column', 'value'),
-         State('stored-data', 'data')]
+         State('x-axis', 'value'),
+         State('forecast-group', 'value'),
+         State('stored-data', 'data'),
+         State('crossfilter', 'data')],
+        background=True,
+        manager=background_manager,
+        running=[
+            (Output('apply-ai-button', 'disabled'), True, False),
+            (Output('cancel-ai-button', 'style'), {'display': 'inline-block'}, {'display': 'none'}),
+            (Output('ai-progress', 'style'), {'display': 'block'}, {'display': 'none'}),
+        ],
+        cancel=[Input('cancel-ai-button', 'n_clicks')],
+        progress=[Output('ai-progress', 'value'), Output('ai-progress', 'max')],
+        prevent_initial_call=True
     )
-    def apply_ai_analysis(n_clicks, analysis_type, column, stored_data):
+    @instrument_callback
+    def apply_ai_analysis(set_progress, n_clicks, analysis_type, columns, x_axis, group_column, stored_data,
+                          crossfilter):
+        """
+        Запускает AI-анализ (аномалии, прогноз, кластеризация) в фоновом процессе.
+        Пока задача идёт, показывается прогресс и кнопка отмены.
+        Анализируются строки, отобранные перекрёстным фильтром.
+        """
         if not n_clicks or not stored_data:
             raise PreventUpdate
 
         try:
-            df = pd.DataFrame.from_dict(stored_data)
-
-            if analysis_type == 'anomaly':
-                if not column:
-                    numeric_cols = df.select_dtypes(include=['number']).columns
-                    if not numeric_cols.empty:
-                        column = numeric_cols[0]
-                    else:
-                        return "Нет числовых колонок для анализа"
-
-                df = detect_anomalies(df, column)
-                return dcc.Graph(
-                    figure=px.scatter(df, x=df.index, y=column, color='anomaly',
-                                      title='Анализ аномалий')
-                )
+            figure = run_analysis(set_progress, analysis_type, stored_data, columns, x_axis, group_column,
+                                  crossfilter)
+            return dcc.Graph(figure=figure)
 
         except Exception as e:
+            record_error()
             return html.Div(f"Ошибка: {str(e)}", style={'color': 'red'})
 
     @app.callback(
-        Output('anomaly-column-selector', 'options'),
+        [Output('anomaly-column', 'options'),
+         Output('forecast-group', 'options')],
+        [Input('stored-data', 'data')]
+    )
+    @instrument_callback
+    def update_columns(stored_data):
+        if not stored_data:
+            raise PreventUpdate
+        profile = stored_data['profile']
+        numeric_cols = columns_of_kind(profile, 'numeric')
+        # Группировать прогноз имеет смысл по нечисловым колонкам (товар, регион), но не по
+        # колонкам, где почти все значения различны (идентификаторы)
+        group_cols = [col for col in columns_of_kind(profile, 'categorical', 'bool', 'text')
+                      if profile[col]['distinct_approx'] < GROUP_MAX_DISTINCT_RATIO * stored_data['n_rows']]
+        return ([{'label': col, 'value': col} for col in numeric_cols],
+                [{'label': col, 'value': col} for col in group_cols])
+
+    @app.callback(
+        [Output('linked-x-axis', 'options'),
+         Output('linked-y-axis', 'options')],
         [Input('stored-data', 'data')]
     )
-    def update_columns(data):
-        if not data:
+    @instrument_callback
+    def update_linked_axes(stored_data):
+        if not stored_data:
             raise PreventUpdate
-        df = pd.DataFrame.from_dict(data)
-        return [{'label': col, 'value': col} for col in df.select_dtypes(include=['number']).columns]
+        options = axis_options(stored_data['profile'])
+        return options, options
+
+    @app.callback(
+        Output('graph-type', 'options'),
+        [Input('x-axis', 'value'),
+         Input('y-axis', 'value'),
+         Input('stored-data', 'data')]
+    )
+    @instrument_callback
+    def update_graph_type_options(x_axis, y_axis, stored_data):
+        """Отмечает звёздочкой типы графиков, подходящие выбранным осям (по профилю колонок)."""
+        if not stored_data or not x_axis:
+            return graph_types
+        recommended = recommend_graph_types(stored_data['profile'], x_axis, y_axis)
+        return [{**option, 'label': f"★ {option['label']}"} if option['value'] in recommended else option
+                for option in graph_types]
+
+    @app.callback(
+        [Output('crossfilter', 'data'),
+         Output('crossfilter-status', 'children'),
+         Output('clear-crossfilter', 'style')],
+        [Input('graph', 'selectedData'),
+         Input('graph', 'clickData'),
+         Input('linked-graph', 'selectedData'),
+         Input('linked-graph', 'clickData'),
+         Input('graph-type', 'value'),
+         Input('x-axis', 'value'),
+         Input('y-axis', 'value'),
+         Input('linked-graph-type', 'value'),
+         Input('linked-x-axis', 'value'),
+         Input('linked-y-axis', 'value'),
+         Input('clear-crossfilter', 'n_clicks'),
+         Input('stored-data', 'data')],
+        [State('crossfilter', 'data')],
+        prevent_initial_call=True
+    )
+    @instrument_callback
+    def update_crossfilter(selected, clicked, linked_selected, linked_clicked, graph_type, x_axis, y_axis,
+                           linked_type, linked_x, linked_y, n_clicks, stored_data, crossfilter):
+        """
+        Переводит выделение или клик на графике в условия перекрёстного фильтра.
+        Смена типа или осей графика снимает его условия, новый датасет и кнопка сброса — все.
+        """
+        if not stored_data:
+            raise PreventUpdate
+
+        dataset_id = stored_data['dataset_id']
+        ctx = dash.callback_context
+        trigger_id = ctx.triggered_id
+        prop = ctx.triggered[0]['prop_id'].split('.')[-1]
+        if not crossfilter or crossfilter.get('dataset_id') != dataset_id:
+            crossfilter = {'dataset_id': dataset_id, 'source': None, 'filters': {}, 'revision': 0}
+        filters = dict(crossfilter['filters'])
+        source = None
+
+        revision = crossfilter.get('revision', 0)
+        if trigger_id in ('clear-crossfilter', 'stored-data'):
+            if not filters and trigger_id == 'clear-crossfilter':
+                raise PreventUpdate
+            if filters:
+                revision += 1  # графики снимут выделения
+            filters = {}
+        elif trigger_id in CROSSFILTER_GRAPHS:
+            graph_settings = {'graph': (graph_type, x_axis, y_axis, selected, clicked),
+                              'linked-graph': (linked_type, linked_x, linked_y, linked_selected, linked_clicked)}
+            source = trigger_id
+            kind, x, y, selected_data, click_data = graph_settings[source]
+            # Выделение переводится в условия по тем же строкам, по которым построен график
+            drawn_filters = active_filters(crossfilter, dataset_id, exclude=source)
+            with stage('load'):
+                df = _load_columns(stored_data, [x, y], drawn_filters)
+            with stage('crossfilter'):
+                df = apply_crossfilter(dataset_id, df, drawn_filters)
+            if prop == 'clickData':
+                conditions = selection_conditions(df, kind, x, y, click_data=click_data)
+                # Клик по точке числового графика ничего не отбирает и не снимает выделение
+                if not conditions:
+                    raise PreventUpdate
+            else:
+                conditions = selection_conditions(df, kind, x, y, selected_data=selected_data)
+            if conditions:
+                filters[source] = conditions
+            elif source in filters:
+                del filters[source]
+            else:
+                raise PreventUpdate
+        else:
+            # Сменились тип или оси графика: его выделение больше не видно
+            source = next(graph_id for graph_id, settings in CROSSFILTER_GRAPHS.items() if trigger_id in settings)
+            if source not in filters:
+                raise PreventUpdate
+            del filters[source]
+
+        crossfilter = {'dataset_id': dataset_id, 'source': source, 'filters': filters, 'revision': revision}
+
+        conditions = active_filters(crossfilter, dataset_id)
+        if not conditions:
+            return crossfilter, None, {'display': 'none'}
+        with stage('load'):
+            df = _load_columns(stored_data, [], conditions)
+        with stage('crossfilter'):
+            n_selected = int(crossfilter_mask(dataset_id, df, conditions).sum())
+        record_rows(len(df))
+        return crossfilter, f"Отобрано {n_selected} из {len(df)} строк", {'display': 'inline-block'}
 
     @app.callback(
         [Output('graph', 'figure'),
@@ -64,11 +262,14 @@ def register_graph_callbacks(app):
          Input('x-axis', 'value'),
          Input('y-axis', 'value'),
          Input('z-axis', 'value'),
-         Input('upload-data', 'contents'),
-         Input('close-notification', 'n_clicks')],
+         Input('stored-data', 'data'),
+         Input('close-notification', 'n_clicks'),
+         Input('graph', 'relayoutData'),
+         Input('crossfilter', 'data')],
         prevent_initial_call=True
     )
-    def update_graph(graph_type, x_axis, y_axis, z_axis, contents, n_clicks):
+    @instrument_callback
+    def update_graph(graph_type, x_axis, y_axis, z_axis, stored_data, n_clicks, relayout_data, crossfilter):
         """
         Основной callback для построения графиков и обработки взаимодействий.
         """
@@ -79,155 +280,55 @@ def register_graph_callbacks(app):
         if trigger_id == 'close-notification':
             return dash.no_update, None, {'display': 'none'}, {'display': 'none'}
 
+        # Собственное выделение график не фильтрует
+        if trigger_id == 'crossfilter' and crossfilter and crossfilter.get('source') == 'graph':
+            raise PreventUpdate
+
+        # Приближение перестраивает только прореживаемые графики
+        x_range = _zoom_range(trigger_id, 'graph', graph_type, relayout_data)
+
         # Проверка наличия данных
-        if not contents:
+        if not stored_data:
             raise PreventUpdate
 
         try:
-            df = process_uploaded_file(contents)
-
             # Базовые проверки
             if not x_axis or (graph_type not in ['histogram', 'pie'] and not y_axis):
                 raise PreventUpdate
 
-            # Построение графиков
-            if graph_type == 'line':
-                fig = px.line(df, x=x_axis, y=y_axis, title='Линейный график')
-            elif graph_type == 'bar':
-                fig = px.bar(df, x=x_axis, y=y_axis, title='Столбчатая диаграмма')
-            elif graph_type == 'pie':
-                if not x_axis:
-                    return dash.no_update, "Для круговой диаграммы нужно выбрать категории (ось X)", {
-                        'display': 'block'}, {'display': 'block'}
-
-                # Если y_axis не указан, считаем количество каждой категории
-                if not y_axis:
-                    pie_data = df[x_axis].value_counts().reset_index()
-                    pie_data.columns = ['category', 'count']
-                    fig = px.pie(pie_data,
-                                 names='category',
-                                 values='count',
-                                 title=f'Распределение по {x_axis} (количество)')
-                else:
-                    # Если y_axis указан, используем его значения (любого типа)
-                    pie_df = df[[x_axis, y_axis]].dropna()
-
-                    if len(pie_df) == 0:
-                        return dash.no_update, "Нет данных для построения диаграммы", {'display': 'block'}, {
-                            'display': 'block'}
-
-                    # Для нечисловых значений преобразуем в строки и считаем количество
-                    if not pd.api.types.is_numeric_dtype(pie_df[y_axis]):
-                        pie_data = pie_df.groupby([x_axis, y_axis]).size().reset_index(name='count')
-                        fig = px.pie(pie_data,
-                                     names=y_axis,
-                                     values='count',
-                                     title=f'Распределение {y_axis} по {x_axis}',
-                                     color=x_axis)
-                    else:
-                        # Для числовых значений используем как есть
-                        fig = px.pie(pie_df,
-                                     names=x_axis,
-                                     values=y_axis,
-                                     title=f'Распределение {y_axis} по {x_axis}')
-
-                # Улучшаем отображение
-                fig.update_traces(textposition='inside', textinfo='percent+label')
-                fig.update_layout(uniformtext_minsize=10, uniformtext_mode='hide',
-                                  legend=dict(orientation="h", yanchor="bottom", y=-0.2))
-            elif graph_type == 'scatter':
-                fig = px.scatter(df, x=x_axis, y=y_axis, title='Точечная диаграмма')
-            elif graph_type == 'histogram':
-                fig = px.histogram(df, x=x_axis, title='Гистограмма')
-            elif graph_type == 'box':
-                fig = px.box(df, x=x_axis, y=y_axis, title='Ящик с усами')
-            elif graph_type == 'heatmap':
-                if not x_axis or not y_axis:
-                    return dash.no_update, "Для тепловой карты нужны X и Y оси", {'display': 'block'}, {
-                        'display': 'block'}
-                fig = px.density_heatmap(df, x=x_axis, y=y_axis, title='Тепловая карта')
-            elif graph_type == 'bubble':
-                if not x_axis or not y_axis:
-                    return dash.no_update, "Для пузырьковой диаграммы нужны X и Y оси", {'display': 'block'}, {
-                        'display': 'block'}
-
-                # Проверяем, есть ли числовая колонка для размера пузырьков
-                numeric_cols = df.select_dtypes(include=['number']).columns
-                size_col = z_axis if z_axis in numeric_cols else (
-                    numeric_cols[2] if len(numeric_cols) > 2 else None
-                )
-
-                # Если нет подходящей колонки для размера, используем постоянный размер
-                if size_col is None:
-                    fig = px.scatter(df, x=x_axis, y=y_axis,
-                                     title='Пузырьковая диаграмма (постоянный размер)')
-                else:
-                    # Нормализуем размер для лучшего отображения
-                    sizes = (df[size_col] - df[size_col].min()) / (df[size_col].max() - df[size_col].min()) * 100 + 10
-                    fig = px.scatter(df, x=x_axis, y=y_axis, size=sizes,
-                                     title=f'Пузырьковая диаграмма (размер: {size_col})')
-
-                # Настраиваем внешний вид
-                fig.update_traces(marker=dict(opacity=0.7, line=dict(width=0.5, color='DarkSlateGrey')))
-            elif graph_type == 'sankey':
-                if not x_axis or not y_axis:
-                    return dash.no_update, "Для диаграммы Санкея нужны источник и цель", {'display': 'block'}, {
-                        'display': 'block'}
-
-                # Группируем данные для подсчета потоков
-                df_sankey = df.groupby([x_axis, y_axis]).size().reset_index(name='value')
-
-                # Создаем словарь узлов
-                unique_nodes = pd.unique(df[[x_axis, y_axis]].values.ravel('K'))
-                node_dict = {node: i for i, node in enumerate(unique_nodes)}
-
-                fig = go.Figure(go.Sankey(
-                    node=dict(
-                        label=list(node_dict.keys()),
-                        pad=15,
-                        thickness=20,
-                        line=dict(color="black", width=0.5)
-                    ),
-                    link=dict(
-                        source=df_sankey[x_axis].map(node_dict),
-                        target=df_sankey[y_axis].map(node_dict),
-                        value=df_sankey['value'].tolist(),
-                        color="rgba(0,128,0,0.3)"
-                    )
-                ))
-                fig.update_layout(title_text='Диаграмма Санкея', font_size=10)
-            elif graph_type == 'choropleth':
-                if not x_axis:
-                    return dash.no_update, "Для карты нужна колонка с географическими данными", {'display': 'block'}, {
-                        'display': 'block'}
-                fig = px.choropleth(df, locations=x_axis, locationmode='country names',
-                                    color=y_axis if y_axis else df.columns[1],
-                                    title='Географическая карта')
-            elif graph_type == 'gantt':
-                if not all(col in df.columns for col in ['Task', 'Start', 'Finish']):
-                    return dash.no_update, "Для графика Ганта нужны колонки: Task, Start, Finish", {
-                        'display': 'block'}, {'display': 'block'}
-                fig = px.timeline(df, x_start="Start", x_end="Finish", y="Task", title='График Ганта')
-            elif graph_type == 'candlestick':
-                if not all(col in df.columns for col in ['open', 'high', 'low', 'close']):
-                    return dash.no_update, "Для биржевого графика нужны колонки: open, high, low, close", {
-                        'display': 'block'}, {'display': 'block'}
-                fig = go.Figure(go.Candlestick(
-                    x=df[x_axis] if x_axis else df.index,
-                    open=df['open'],
-                    high=df['high'],
-                    low=df['low'],
-                    close=df['close']
-                ))
-            elif graph_type == 'combo':
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=df[x_axis], y=df[y_axis], name='Линия'))
-                fig.add_trace(go.Bar(x=df[x_axis], y=df[y_axis], name='Столбцы'))
-                fig.update_layout(title='Комбинированная диаграмма')
-            else:
-                fig = px.scatter(title='Выберите тип графика')
-
+            fig = render_graph('graph', graph_type, x_axis, y_axis, z_axis, stored_data, crossfilter, x_range)
             return fig, None, {'display': 'none'}, {'display': 'none'}
 
+        except FigureError as e:
+            return dash.no_update, str(e), {'display': 'block'}, {'display': 'block'}
         except Exception as e:
+            record_error()
             return px.scatter(title='Ошибка'), str(e), {'display': 'block'}, {'display': 'block'}
+
+    @app.callback(
+        Output('linked-graph', 'figure'),
+        [Input('linked-graph-type', 'value'),
+         Input('linked-x-axis', 'value'),
+         Input('linked-y-axis', 'value'),
+         Input('stored-data', 'data'),
+         Input('linked-graph', 'relayoutData'),
+         Input('crossfilter', 'data')],
+        prevent_initial_call=True
+    )
+    @instrument_callback
+    def update_linked_graph(graph_type, x_axis, y_axis, stored_data, relayout_data, crossfilter):
+        """Второй график: показывает строки, отобранные на основном, и сам фильтрует их."""
+        trigger_id = dash.callback_context.triggered_id
+        if trigger_id == 'crossfilter' and crossfilter and crossfilter.get('source') == 'linked-graph':
+            raise PreventUpdate
+        x_range = _zoom_range(trigger_id, 'linked-graph', graph_type, relayout_data)
+        if not stored_data or not x_axis or (graph_type not in ['histogram', 'pie'] and not y_axis):
+            raise PreventUpdate
+
+        try:
+            return render_graph('linked-graph', graph_type, x_axis, y_axis, None, stored_data, crossfilter, x_range)
+        except FigureError as e:
+            return px.scatter(title=str(e))
+        except Exception as e:
+            record_error()
+            return px.scatter(title=f"Ошибка: {e}")
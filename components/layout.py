@@ -1,5 +1,7 @@
 from dash import dcc, html
 
+import config
+
 graph_types = [
     # Базовые (используются в 80% случаев)
     {'label': 'Столбчатая', 'value': 'bar'},
@@ -47,6 +49,22 @@ def create_layout():
             style={'margin': '20px'}
         ),
 
+        # Большие файлы грузятся кусками через /upload (assets/chunked_upload.js)
+        html.Div([
+            html.Button('Загрузить большой файл', id='large-upload-button',
+                        **{'data-chunk-bytes': str(config.UPLOAD_CHUNK_BYTES)}),
+            html.Span(id='large-upload-status', style={'margin-left': '10px'})
+        ], style={'margin': '0 20px 20px'}),
+        dcc.Store(id='large-upload-result'),
+
+        # Выбор листа для книг Excel с несколькими листами
+        dcc.Dropdown(
+            id='excel-sheet',
+            clearable=False,
+            placeholder="Лист книги",
+            style={'display': 'none'}
+        ),
+
         html.Div(id='output-data-upload'),
 
         dcc.Dropdown(
@@ -79,7 +97,13 @@ def create_layout():
 
         dcc.Dropdown(
             id='anomaly-column',
-            placeholder="Выберите колонку для анализа аномалий"
+            multi=True,
+            placeholder="Выберите колонки для анализа аномалий"
+        ),
+
+        dcc.Dropdown(
+            id='forecast-group',
+            placeholder="Группировка прогноза (например, товар или регион)"
         ),
 
         html.Div([
@@ -88,16 +112,51 @@ def create_layout():
                 options=ai_analysis_types,
                 placeholder="Выберите AI-анализ"
             ),
-            html.Button('Применить AI', id='apply-ai-button')
+            html.Button('Применить AI', id='apply-ai-button'),
+            html.Button('Отменить', id='cancel-ai-button', style={'display': 'none'}),
+            html.Progress(id='ai-progress', value='0', max='4', style={'display': 'none'})
         ], style={'margin': '20px 0'}),
 
         html.Div(id='ai-analysis-output'),
 
+        # Выделение или клик на одном графике фильтрует второй график, таблицу и AI-анализ
+        dcc.Store(id='crossfilter'),
+        html.Div([
+            html.Span(id='crossfilter-status'),
+            html.Button('Сбросить фильтр', id='clear-crossfilter', n_clicks=0,
+                        style={'display': 'none', 'margin-left': '10px'})
+        ], style={'margin': '10px 0'}),
+
         dcc.Graph(
             id='graph',
             style={'height': '70vh', 'margin': '20px 0'}
         ),
 
+        html.Div([
+            dcc.Dropdown(
+                id='linked-graph-type',
+                options=graph_types,
+                value='histogram',
+                clearable=False,
+                style={'flex': '1'}
+            ),
+            dcc.Dropdown(
+                id='linked-x-axis',
+                placeholder="Ось X второго графика",
+                style={'flex': '1'}
+            ),
+            dcc.Dropdown(
+                id='linked-y-axis',
+                placeholder="Ось Y второго графика",
+                style={'flex': '1'}
+            )
+        ], style={'display': 'flex', 'gap': '10px', 'margin': '10px 0'}),
+
+        dcc.Graph(
+            id='linked-graph',
+            style={'height': '50vh', 'margin': '20px 0'}
+        ),
+
         html.Div(id='notification', style={
             'position': 'fixed',
             'top': '20px',
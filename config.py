@@ -0,0 +1,110 @@
+import os
+import tempfile
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Кэш разобранных датасетов (content hash -> DataFrame)
+DATASET_CACHE_MAX_ITEMS = _env_int('VISUALCSV_DATASET_CACHE_ITEMS', 16)
+DATASET_CACHE_MAX_BYTES = _env_int('VISUALCSV_DATASET_CACHE_BYTES', 2 * 1024 ** 3)
+
+# Колоночное хранилище датасетов на диске (Arrow/Feather, читается через memory map)
+DATASET_STORE_DIR = os.environ.get(
+    'VISUALCSV_DATASET_DIR', os.path.join(tempfile.gettempdir(), 'visualcsv-datasets'))
+DATASET_STORE_MAX_BYTES = _env_int('VISUALCSV_DATASET_DIR_BYTES', 20 * 1024 ** 3)
+
+# Потоковый разбор загрузок
+BASE64_CHUNK_CHARS = 4 * 1024 * 1024  # кратно 4, чтобы куски base64 декодировались независимо
+CSV_CHUNK_ROWS = _env_int('VISUALCSV_CSV_CHUNK_ROWS', 250_000)
+# Колонка, в которую склеиваются лишние поля некорректных строк CSV (по умолчанию — последняя)
+CSV_MERGE_COLUMN = os.environ.get('VISUALCSV_CSV_MERGE_COLUMN') or None
+# Загрузка больших файлов кусками через /upload в обход dcc.Upload
+UPLOAD_DIR = os.environ.get('VISUALCSV_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'visualcsv-uploads'))
+UPLOAD_CHUNK_BYTES = _env_int('VISUALCSV_UPLOAD_CHUNK_BYTES', 8 * 1024 ** 2)
+UPLOAD_MAX_BYTES = _env_int('VISUALCSV_UPLOAD_MAX_BYTES', 50 * 1024 ** 3)
+UPLOAD_STALE_SECONDS = 24 * 3600  # незавершённые загрузки старше этого удаляются
+# Разбор Excel: движок ('auto' — calamine, если установлен python-calamine) и процессы для листов
+EXCEL_ENGINE = os.environ.get('VISUALCSV_EXCEL_ENGINE', 'auto')
+EXCEL_WORKERS = _env_int('VISUALCSV_EXCEL_WORKERS', 0)  # 0 — по числу ядер
+TRACK_PARSE_MEMORY = os.environ.get('VISUALCSV_TRACK_PARSE_MEMORY', '1') == '1'
+PARSE_MEMORY_SAMPLE_SECONDS = 0.02
+
+# Прореживание линий и облаков точек
+POINT_BUDGET = _env_int('VISUALCSV_POINT_BUDGET', 5000)
+WEBGL_THRESHOLD = _env_int('VISUALCSV_WEBGL_THRESHOLD', 1000)
+
+# Серверная агрегация для столбчатых диаграмм, гистограмм, ящиков и тепловых карт
+HISTOGRAM_MAX_BINS = _env_int('VISUALCSV_HISTOGRAM_MAX_BINS', 100)
+HEATMAP_MAX_BINS = _env_int('VISUALCSV_HEATMAP_MAX_BINS', 60)
+BAR_MAX_BARS = _env_int('VISUALCSV_BAR_MAX_BARS', 100)  # больше значений x — корзины или топ категорий
+BOX_MAX_GROUPS = 50
+BOX_MAX_OUTLIERS = 2000
+
+# Перекрёстная фильтрация: индексы колонок (битовые карты — для колонок до N категорий)
+CROSSFILTER_BITMAP_MAX_CATEGORIES = 64
+CROSSFILTER_INDEX_MAX_ITEMS = _env_int('VISUALCSV_CROSSFILTER_INDEX_ITEMS', 64)
+CROSSFILTER_INDEX_MAX_BYTES = _env_int('VISUALCSV_CROSSFILTER_INDEX_BYTES', 1024 ** 3)
+
+# Кэш готовых фигур (JSON) по датасету, типу графика и осям
+FIGURE_CACHE_MAX_ITEMS = _env_int('VISUALCSV_FIGURE_CACHE_ITEMS', 256)
+FIGURE_CACHE_MAX_BYTES = _env_int('VISUALCSV_FIGURE_CACHE_BYTES', 256 * 1024 ** 2)
+
+# Фоновые задачи AI-анализа (очередь Dash и кэш результатов в diskcache)
+JOB_CACHE_DIR = os.environ.get(
+    'VISUALCSV_JOB_DIR', os.path.join(tempfile.gettempdir(), 'visualcsv-jobs'))
+JOB_RESULT_CACHE_BYTES = _env_int('VISUALCSV_JOB_RESULT_BYTES', 1024 ** 3)
+FORECAST_PERIODS = 30
+
+# Профилирование callback'ов: метрики — всегда на /metrics, профиль вызова — по заголовку запроса
+PROFILE_ENABLED = os.environ.get('VISUALCSV_PROFILE', '0') == '1'
+PROFILE_HEADER = 'X-VisualCSV-Profile'
+PROFILE_DIR = os.environ.get('VISUALCSV_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'visualcsv-profiles'))
+
+# Боевой режим: gunicorn с несколькими воркерами (gunicorn.conf.py). Датасеты воркеры берут
+# из общего DATASET_STORE_DIR, кэши в памяти (DATASET_CACHE_MAX_BYTES и др.) — у каждого воркера свои
+SERVER_BIND = os.environ.get('VISUALCSV_BIND', '0.0.0.0:8050')
+SERVER_WORKERS = _env_int('VISUALCSV_WORKERS', 0)  # 0 — по числу ядер
+SERVER_THREADS = _env_int('VISUALCSV_THREADS', 4)
+SERVER_TIMEOUT = _env_int('VISUALCSV_TIMEOUT', 300)  # разбор большого файла идёт внутри запроса
+METRICS_DIR = os.environ.get(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'visualcsv-metrics'))
+# Отладочный сервер Flask (python app.py)
+DEBUG = os.environ.get('VISUALCSV_DEBUG', '1') == '1'
+PORT = _env_int('VISUALCSV_PORT', 8050)
+
+# Бюджет времени импорта приложения при старте воркера (python -m utils.startup)
+STARTUP_IMPORT_BUDGET = float(os.environ.get('VISUALCSV_STARTUP_BUDGET', '5'))
+
+# Поиск аномалий
+ANOMALY_MAX_FIT_SAMPLES = _env_int('VISUALCSV_ANOMALY_FIT_SAMPLES', 100_000)
+ANOMALY_BATCH_SIZE = _env_int('VISUALCSV_ANOMALY_BATCH_SIZE', 500_000)
+ANOMALY_STREAMING_ROWS = _env_int('VISUALCSV_ANOMALY_STREAMING_ROWS', 5_000_000)
+ANOMALY_ROLLING_WINDOW = 1000
+ANOMALY_MAD_THRESHOLD = 3.5
+
+# Кластеризация и кэш обученных моделей
+CLUSTER_SAMPLE_ROWS = _env_int('VISUALCSV_CLUSTER_SAMPLE_ROWS', 20_000)
+CLUSTER_SILHOUETTE_SAMPLES = 5000
+CLUSTER_CHUNK_ROWS = _env_int('VISUALCSV_CLUSTER_CHUNK_ROWS', 200_000)
+CLUSTER_MAX_K = 8
+MODEL_CACHE_BYTES = _env_int('VISUALCSV_MODEL_CACHE_BYTES', 1024 ** 3)
+
+# Прогнозирование: короткие ряды — модель Хольта, длинные — Prophet, группы — в пуле процессов
+FORECAST_MIN_HISTORY = 30
+FORECAST_MAX_GROUPS = _env_int('VISUALCSV_FORECAST_MAX_GROUPS', 200)
+FORECAST_PLOT_GROUPS = 10
+FORECAST_WORKERS = _env_int('VISUALCSV_FORECAST_WORKERS', 0)  # 0 — по числу ядер
+
+# Оптимизация типов при загрузке
+SCHEMA_SAMPLE_ROWS = 1000
+CATEGORY_MAX_RATIO = 0.5  # category, если уникальных значений не больше этой доли строк
+SCHEMA_DETECT_ALL_DATES = os.environ.get('VISUALCSV_DETECT_DATES', '1') == '1'
+
+# Профиль колонок при загрузке (utils.column_profile)
+COLUMN_PROFILE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+COLUMN_PROFILE_DISTINCT_K = 1024  # оценка числа различных значений с погрешностью ~3%
+COLUMN_PROFILE_CHUNK_ROWS = 1_000_000
+PIE_MAX_CATEGORIES = 7  # круговая диаграмма рекомендуется, если категорий не больше
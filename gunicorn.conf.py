@@ -0,0 +1,46 @@
+"""
+Настройки gunicorn для боевого запуска:
+
+    gunicorn app:server
+
+Каждый воркер — отдельный процесс со своими кэшами в памяти. Разобранные датасеты
+общие: они лежат колоночными файлами Arrow в DATASET_STORE_DIR и читаются любым
+воркером через memory map, так что загруженный через один воркер файл сразу доступен
+callback'ам в другом без повторного разбора. Фоновые задачи, результаты анализов
+и модели общие через diskcache в JOB_CACHE_DIR. Метрики Prometheus всех воркеров
+собираются из файлов в PROMETHEUS_MULTIPROC_DIR.
+
+Параметры задаются переменными окружения (см. config.py): VISUALCSV_BIND, VISUALCSV_WORKERS,
+VISUALCSV_THREADS, VISUALCSV_TIMEOUT, VISUALCSV_DATASET_DIR, VISUALCSV_DATASET_CACHE_BYTES.
+"""
+import glob
+import os
+
+# Имя config занято настройкой gunicorn (путь к этому файлу)
+import config as app_config
+
+bind = app_config.SERVER_BIND
+workers = app_config.SERVER_WORKERS or os.cpu_count() or 1
+# Потоки: пока один callback строит график, другие отвечают на опрос фоновых задач
+worker_class = 'gthread'
+threads = app_config.SERVER_THREADS
+timeout = app_config.SERVER_TIMEOUT
+# Приложение загружается в каждом воркере после fork: соединения diskcache (SQLite)
+# нельзя наследовать от родительского процесса
+preload_app = False
+
+# Должно быть задано до импорта prometheus_client в воркерах
+os.environ['PROMETHEUS_MULTIPROC_DIR'] = app_config.METRICS_DIR
+
+
+def on_starting(server):
+    # Метрики прошлого запуска не смешиваются с новыми
+    os.makedirs(app_config.METRICS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(app_config.METRICS_DIR, '*.db')):
+        os.remove(path)
+    server.log.info(f"Воркеров: {workers}, потоков: {threads}, датасеты: {app_config.DATASET_STORE_DIR}")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
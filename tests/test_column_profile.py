@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+import config
+from utils.column_profile import approx_distinct, profile_column
+
+
+def test_exact_below_k():
+    values = pd.Series(np.repeat(np.arange(700), 3))
+    assert approx_distinct(values, k=1024) == 700
+    assert approx_distinct(pd.Series(['a', 'b', None, 'a']), k=16) == 2
+    assert approx_distinct(pd.Series([], dtype=float), k=16) == 0
+
+
+def test_exact_below_k_across_chunks(monkeypatch):
+    monkeypatch.setattr(config, 'COLUMN_PROFILE_CHUNK_ROWS', 1000)
+    values = pd.Series(np.random.default_rng(0).integers(0, 900, 50_000))
+    assert approx_distinct(values, k=1024) == values.nunique()
+
+
+def test_estimate_error_is_small_above_k(monkeypatch):
+    monkeypatch.setattr(config, 'COLUMN_PROFILE_CHUNK_ROWS', 100_000)
+    rng = np.random.default_rng(1)
+    for n_distinct in (5_000, 200_000):
+        values = pd.Series(rng.integers(0, n_distinct, 600_000))
+        exact = values.nunique()
+        # Погрешность KMV ~ 1/sqrt(k) ≈ 3%; берём с запасом
+        assert abs(approx_distinct(values, k=1024) - exact) / exact < 0.1
+
+
+def test_profile_uses_exact_cardinality_for_categories():
+    column = pd.Series(pd.Categorical(['x', 'y', 'x', None], categories=['x', 'y', 'z']))
+    profile = profile_column(column)
+    assert profile['kind'] == 'categorical'
+    assert profile['cardinality'] == profile['distinct_approx'] == 2
+    assert profile['nulls'] == 1
@@ -0,0 +1,72 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.crossfilter import ColumnIndex, crossfilter_mask
+
+
+def _frame(n=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=n)
+    x[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        'x': x,
+        'y': rng.uniform(-3, 3, n),
+        'when': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'city': pd.Categorical(rng.choice(['a', 'b', 'c', None], n)),
+        'code': rng.integers(0, 500, n).astype(str),
+    })
+
+
+def _mask(df, *conditions):
+    return crossfilter_mask(uuid.uuid4().hex, df, list(conditions))
+
+
+def test_range_mask_matches_scan():
+    df = _frame()
+    index = ColumnIndex(df['x'])
+    for low, high in [(-0.5, 0.5), (-10, 10), (2.0, 1.0), (0.3, 0.3)]:
+        expected = ((df['x'] >= low) & (df['x'] <= high)).to_numpy()
+        assert np.array_equal(index.range_mask(low, high), expected)
+
+
+def test_date_range_condition_matches_scan():
+    df = _frame()
+    low, high = pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-31')
+    mask = _mask(df, {'column': 'when', 'range': [float(low.value), float(high.value)]})
+    assert np.array_equal(mask, df['when'].between(low, high).to_numpy())
+
+
+def test_values_mask_matches_scan_for_bitmaps_and_groups(monkeypatch):
+    df = _frame()
+    for column, values in [('city', ['a', 'c']), ('code', ['7', '42', '499', 'нет такого'])]:
+        expected = df[column].isin(values).to_numpy()
+        for max_categories in (10_000, 1):
+            monkeypatch.setattr(config, 'CROSSFILTER_BITMAP_MAX_CATEGORIES', max_categories)
+            index = ColumnIndex(df[column])
+            assert (index.bitmaps is not None) == (max_categories > 1)
+            assert np.array_equal(index.values_mask(values), expected)
+    assert not ColumnIndex(df['city']).values_mask([]).any()
+
+
+def test_polygon_mask_matches_scan():
+    df = _frame()
+    x, y = df['x'].to_numpy(), df['y'].to_numpy()
+
+    # Ромб |x| + |y| <= 1
+    diamond = {'columns': ['x', 'y'], 'polygon': [[1, 0, -1, 0], [0, 1, 0, -1]]}
+    assert np.array_equal(_mask(df, diamond), np.abs(x) + np.abs(y) < 1)
+
+    # Невыпуклый уголок: [0, 2] x [0, 1] и [0, 1] x [1, 2]
+    corner = {'columns': ['x', 'y'], 'polygon': [[0, 2, 2, 1, 1, 0], [0, 0, 1, 1, 2, 2]]}
+    expected = (((x > 0) & (x < 2) & (y > 0) & (y < 1)) |
+                ((x > 0) & (x < 1) & (y >= 1) & (y < 2)))
+    assert np.array_equal(_mask(df, corner), expected)
+
+
+def test_conditions_are_combined():
+    df = _frame()
+    mask = _mask(df, {'column': 'x', 'range': [-1, 1]}, {'column': 'city', 'values': ['b']})
+    assert np.array_equal(mask, (df['x'].between(-1, 1) & (df['city'] == 'b')).to_numpy())
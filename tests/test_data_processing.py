@@ -0,0 +1,70 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.data_processing import parse_csv_with_commas, read_csv_chunked
+from utils.dataset_cache import DatasetStore
+
+
+def _csv_with_late_strings(n_rows=300_000, first_text_row=260_000) -> bytes:
+    """Колонка code числовая в первых строках и текстовая (A...) дальше — на границе кусков."""
+    codes = [str(i) if i < first_text_row else f"A{i}" for i in range(n_rows)]
+    df = pd.DataFrame({'code': codes, 'value': np.arange(n_rows)})
+    return df.to_csv(index=False).encode()
+
+
+def test_chunks_with_different_dtypes_become_strings(tmp_path):
+    assert config.CSV_CHUNK_ROWS < 260_000
+    df = read_csv_chunked(io.BytesIO(_csv_with_late_strings()))
+
+    assert df['code'].map(type).eq(str).all()
+    assert df['code'].iloc[0] == '0' and df['code'].iloc[-1] == 'A299999'
+    assert pd.api.types.is_integer_dtype(df['value'])
+    df.sort_values('code')  # смесь int и str не сортируется
+
+    store = DatasetStore(str(tmp_path), 1024 ** 3)
+    assert store.write('mixed', df)
+    restored = store.read('mixed')
+    pd.testing.assert_frame_equal(restored, df, check_dtype=False)
+
+
+def test_repaired_rows_keep_original_order():
+    content = ("id,name,comment\n"
+               "1,a,ok\n"
+               "2,b,one,two\n"
+               "3,c,fine\n"
+               "4,d,x,y,z\n"
+               "5,e,last\n")
+    df = parse_csv_with_commas(content)
+
+    assert df['id'].tolist() == [1, 2, 3, 4, 5]
+    assert df['comment'].tolist() == ['ok', 'one, two', 'fine', 'x, y, z', 'last']
+
+
+def test_first_and_consecutive_bad_rows_keep_order():
+    content = "id,text\n1,a,b\n2,c,d\n3,e\n4,f,g\n"
+    df = parse_csv_with_commas(content)
+
+    assert df['id'].tolist() == [1, 2, 3, 4]
+    assert df['text'].tolist() == ['a, b', 'c, d', 'e', 'f, g']
+
+
+def test_short_rows_are_padded_with_nulls():
+    df = parse_csv_with_commas("id,name,value\n1,a,10\n2\n3,c\n4,d,40\n")
+
+    assert df['id'].tolist() == [1, 2, 3, 4]
+    assert df['name'].isna().tolist() == [False, True, False, False]
+    assert df['value'].isna().tolist() == [False, True, True, False]
+    assert df['value'].iloc[3] == 40
+
+
+def test_extra_fields_merge_into_chosen_column():
+    content = "id,text,value\n1,plain,10\n2,with,comma,20\n"
+    expected = ['plain', 'with, comma']
+
+    for merge_column in ('text', 1):
+        df = parse_csv_with_commas(content, merge_column=merge_column)
+        assert df['text'].tolist() == expected
+        assert df['value'].tolist() == [10, 20]
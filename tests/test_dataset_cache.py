@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from utils.dataset_cache import DatasetStore
+from utils.schema import optimize_schema
+
+
+def test_mixed_object_columns_are_persisted_as_strings(tmp_path):
+    df = pd.DataFrame({'mixed': [1, 'a', 2.5, None], 'value': np.arange(4)})
+
+    store = DatasetStore(str(tmp_path), 1024 ** 3)
+    assert store.write('mixed', df)
+    restored = store.read('mixed')
+
+    assert restored['mixed'].iloc[:3].tolist() == ['1', 'a', '2.5']
+    assert restored['mixed'].isna().iloc[3]
+    assert restored['value'].tolist() == [0, 1, 2, 3]
+
+
+def test_mixed_categories_from_schema_are_persisted_as_strings(tmp_path):
+    df, _ = optimize_schema(pd.DataFrame({'code': [1, 'a', 2, 'b'] * 10, 'value': np.arange(40)}))
+    assert isinstance(df['code'].dtype, pd.CategoricalDtype)
+
+    store = DatasetStore(str(tmp_path), 1024 ** 3)
+    assert store.write('mixed-category', df)
+    restored = store.read('mixed-category')
+
+    assert restored['code'].astype(str).tolist() == ['1', 'a', '2', 'b'] * 10
+    assert restored['value'].tolist() == list(range(40))
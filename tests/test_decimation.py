@@ -0,0 +1,21 @@
+import numpy as np
+
+from utils.decimation import density_sample_indices
+
+
+def test_density_sample_stays_within_budget():
+    rng = np.random.default_rng(0)
+    x, y = rng.random(1_000_000), rng.random(1_000_000)
+    for budget in (10, 1000, 5000):
+        result = density_sample_indices(x, y, budget)
+        assert len(result) <= budget
+        assert len(np.unique(result)) == len(result)
+
+
+def test_density_sample_keeps_outliers():
+    rng = np.random.default_rng(1)
+    x = np.concatenate([rng.normal(size=200_000), [50.0]])
+    y = np.concatenate([rng.normal(size=200_000), [-50.0]])
+    result = density_sample_indices(x, y, 5000)
+    assert len(result) <= 5000
+    assert len(x) - 1 in result
@@ -0,0 +1,12 @@
+import pandas as pd
+
+from utils.schema import optimize_schema
+
+
+def test_time_of_day_is_not_parsed_as_date():
+    df = pd.DataFrame({'time': ['10:30', '11:45:10', '7:05 PM'] * 10,
+                       'date': ['2024-01-05', '2024-02-10', '2024-03-15'] * 10})
+    df, _ = optimize_schema(df)
+
+    assert not pd.api.types.is_datetime64_any_dtype(df['time'])
+    assert pd.api.types.is_datetime64_any_dtype(df['date'])
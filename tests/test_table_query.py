@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from utils.table_query import filter_mask, query_positions, split_filter_part
+
+
+def _frame():
+    return pd.DataFrame({
+        'city': pd.Categorical(['Москва', 'Казань', 'Москва', 'Омск', None]),
+        'code': pd.Categorical(['1', '2', '10', '2', '1']),
+        'date': pd.to_datetime(['2024-01-05', '2024-02-10', None, '2024-03-15', '2023-12-31']),
+        'value': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+
+def _rows(df, query):
+    return np.flatnonzero(filter_mask(df, query)).tolist()
+
+
+def test_split_filter_part_keeps_search_text_raw():
+    assert split_filter_part('{value} ge 2') == ('value', 'ge', 2.0)
+    assert split_filter_part('{code} contains 1') == ('code', 'contains', '1')
+    assert split_filter_part('{date} datestartswith 2024') == ('date', 'datestartswith', '2024')
+    assert split_filter_part('{city} eq "Москва"') == ('city', 'eq', 'Москва')
+    assert split_filter_part('{city} unknown x') == (None, None, None)
+
+
+def test_category_column_filters():
+    df = _frame()
+    assert _rows(df, '{city} eq "Москва"') == [0, 2]
+    assert _rows(df, '{city} ne "Москва"') == [1, 3, 4]
+    assert _rows(df, '{city} contains а') == [0, 1, 2]
+    # Числовое значение сравнивается с категориями-строками без '.0'
+    assert _rows(df, '{code} eq 1') == [0, 4]
+    assert _rows(df, '{code} contains 1') == [0, 2, 4]
+
+
+def test_date_column_filters():
+    df = _frame()
+    assert _rows(df, '{date} ge 2024-02-01') == [1, 3]
+    assert _rows(df, '{date} lt 2024-01-01') == [4]
+    assert _rows(df, '{date} datestartswith 2024-0') == [0, 1, 3]
+    # Значение, не похожее на дату, ничего не отбирает и не падает
+    assert _rows(df, '{date} gt abc') == []
+
+
+def test_combined_filters_and_sort():
+    df = _frame()
+    assert _rows(df, '{value} gt 1 && {date} ge 2024-01-01') == [1, 3]
+    positions = query_positions(df, [{'column_id': 'value', 'direction': 'desc'}], '{city} eq "Москва"')
+    assert positions.tolist() == [2, 0]
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+import config
+from utils.instrumentation import stage
+
+# Подпись группы, в которую сводятся редкие категории сверх лимита
+OTHER_LABEL = 'другое'
+
+
+def _is_numeric(column: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+
+def _bin_codes(column: pd.Series, max_bins: int):
+    """
+    Раскладывает значения по корзинам: числа и даты — по равным интервалам,
+    остальное — по категориям: max_bins - 1 самых частых и OTHER_LABEL для остальных.
+    Возвращает (коды, подписи корзин); у NaN код -1.
+    """
+    is_datetime = pd.api.types.is_datetime64_any_dtype(column)
+    if _is_numeric(column) or is_datetime:
+        values = column.to_numpy('datetime64[ns]').astype(np.int64) if is_datetime else \
+            column.to_numpy(np.float64, na_value=np.nan)
+        valid = ~column.isna().to_numpy()
+        if not valid.any():
+            return np.full(len(column), -1), np.array([])
+        edges = np.histogram_bin_edges(values[valid], bins=min(max_bins, max(int(np.sqrt(valid.sum())), 1)))
+        codes = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+        codes[~valid] = -1
+        centers = (edges[:-1] + edges[1:]) / 2
+        if is_datetime:
+            centers = pd.to_datetime(centers.astype(np.int64))
+        return codes, centers
+
+    codes, labels = pd.factorize(column, sort=True)
+    labels = np.asarray(labels)
+    if len(labels) <= max_bins:
+        return codes, labels
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    top = np.sort(np.argsort(counts, kind='stable')[::-1][:max_bins - 1])
+    mapping = np.full(len(labels), len(top))
+    mapping[top] = np.arange(len(top))
+    codes = np.where(codes >= 0, mapping[np.maximum(codes, 0)], -1)
+    return codes, np.append(labels[top].astype(object), OTHER_LABEL)
+
+
+def _many_values(column: pd.Series, limit: int) -> bool:
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return len(column.cat.categories) > limit and column.nunique() > limit
+    return column.nunique() > limit
+
+
+def bar_figure(df: pd.DataFrame, x: str, y: str, title: str):
+    """
+    Столбчатая диаграмма по суммам y в группах x (для нечислового y — число строк).
+    Если значений x больше BAR_MAX_BARS, числа и даты группируются по интервалам,
+    а из категорий остаются самые частые и OTHER_LABEL.
+    """
+    y_is_numeric = _is_numeric(df[y])
+    y_title = y if y_is_numeric else 'количество'
+    with stage('aggregate'):
+        if _many_values(df[x], config.BAR_MAX_BARS):
+            codes, labels = _bin_codes(df[x], config.BAR_MAX_BARS)
+            valid = codes >= 0
+            weights = df[y].to_numpy(np.float64, na_value=0.0)[valid] if y_is_numeric else None
+            bar_x = labels
+            bar_y = np.bincount(codes[valid], weights=weights, minlength=len(labels))
+        else:
+            groups = df.groupby(x, sort=True, observed=True)
+            grouped = groups[y].sum() if y_is_numeric else groups.size()
+            bar_x, bar_y = grouped.index, grouped.to_numpy()
+    fig = go.Figure(go.Bar(x=bar_x, y=bar_y))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y_title)
+    return fig
+
+
+def histogram_figure(df: pd.DataFrame, x: str, title: str):
+    """Гистограмма: корзины считаются на сервере, в браузер уходят только столбцы."""
+    column = df[x]
+    if _is_numeric(column) or pd.api.types.is_datetime64_any_dtype(column):
+        with stage('aggregate'):
+            codes, centers = _bin_codes(column, config.HISTOGRAM_MAX_BINS)
+            counts = np.bincount(codes[codes >= 0], minlength=len(centers))
+        fig = go.Figure(go.Bar(x=centers, y=counts))
+        fig.update_layout(bargap=0)
+    else:
+        with stage('aggregate'):
+            codes, labels = _bin_codes(column, config.HISTOGRAM_MAX_BINS)
+            counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        fig = go.Figure(go.Bar(x=labels, y=counts))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title='count')
+    return fig
+
+
+def _box_stats(values: np.ndarray, max_outliers: int, rng):
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    lowerfence, upperfence = inside.min(), inside.max()
+    outliers = values[(values < lowerfence) | (values > upperfence)]
+    if len(outliers) > max_outliers:
+        outliers = rng.choice(outliers, max_outliers, replace=False)
+    return q1, median, q3, lowerfence, upperfence, outliers
+
+
+def _box_groups(df: pd.DataFrame, x: str, y: str):
+    """Группы ящиков: [(подпись, значения y)] в порядке на оси X."""
+    data = df[[x, y]].dropna()
+    if not _many_values(data[x], config.BOX_MAX_GROUPS):
+        return list(data.groupby(x, sort=True, observed=True)[y])
+    if _is_numeric(data[x]):
+        return [(y, data[y])]
+    codes, labels = _bin_codes(data[x], config.BOX_MAX_GROUPS)
+    return [(labels[code], values) for code, values in data[y].groupby(codes, sort=True)]
+
+
+def box_categories(df: pd.DataFrame, x: str, y: str):
+    """
+    Подписи ящиков по порядку на категориальной оси X (позиции 0, 1, ...) — по ним
+    выделение на графике переводится в значения x. None — ось X показывает сами значения x
+    (числа, даты); пустой список — один ящик на все строки, выделение по x не отбирает.
+    """
+    if pd.api.types.is_datetime64_any_dtype(df[x]):
+        return None
+    if _is_numeric(df[x]):
+        return [] if _many_values(df[x].dropna(), config.BOX_MAX_GROUPS) else None
+    return [name for name, values in _box_groups(df, x, y) if len(values)]
+
+
+def box_figure(df: pd.DataFrame, x: str, y: str, title: str):
+    """
+    Ящик с усами по заранее посчитанным квартилям и усам (1.5 IQR).
+    Группы — значения x; если x — числовая колонка с большим числом значений, ящик один.
+    Даты с большим числом значений группируются по интервалам, из категорий остаются
+    BOX_MAX_GROUPS - 1 самых частых и OTHER_LABEL. Выбросы ограничены BOX_MAX_OUTLIERS
+    точками на группу.
+    """
+    with stage('aggregate'):
+        groups = _box_groups(df, x, y)
+
+        rng = np.random.default_rng(0)
+        names, stats, outlier_x, outlier_y = [], [], [], []
+        for name, values in groups:
+            values = values.to_numpy(np.float64)
+            if len(values) == 0:
+                continue
+            q1, median, q3, lowerfence, upperfence, outliers = _box_stats(values, config.BOX_MAX_OUTLIERS, rng)
+            names.append(name)
+            stats.append((q1, median, q3, lowerfence, upperfence))
+            outlier_x.extend([name] * len(outliers))
+            outlier_y.extend(outliers)
+
+    q1, median, q3, lowerfence, upperfence = (list(column) for column in zip(*stats)) if stats else ([],) * 5
+    fig = go.Figure(go.Box(x=names, q1=q1, median=median, q3=q3,
+                           lowerfence=lowerfence, upperfence=upperfence, name=y, boxpoints=False))
+    fig.add_trace(go.Scatter(x=outlier_x, y=outlier_y, mode='markers', name='выбросы',
+                             marker=dict(color='#636efa', size=4)))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, showlegend=False)
+    return fig
+
+
+def heatmap_figure(df: pd.DataFrame, x: str, y: str, title: str):
+    """Тепловая карта плотности: двумерные корзины считаются на сервере через bincount."""
+    with stage('aggregate'):
+        x_codes, x_labels = _bin_codes(df[x], config.HEATMAP_MAX_BINS)
+        y_codes, y_labels = _bin_codes(df[y], config.HEATMAP_MAX_BINS)
+        valid = (x_codes >= 0) & (y_codes >= 0)
+        counts = np.bincount(y_codes[valid] * len(x_labels) + x_codes[valid],
+                             minlength=len(x_labels) * len(y_labels))
+    fig = go.Figure(go.Heatmap(x=x_labels, y=y_labels, z=counts.reshape(len(y_labels), len(x_labels)),
+                               colorbar=dict(title='count')))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    return fig
+
+
+@stage('aggregate')
+def pie_values(df: pd.DataFrame, names: str, values: str) -> pd.DataFrame:
+    """Суммы values по категориям names — круговой диаграмме не нужны сами строки."""
+    return df.groupby(names, sort=False, observed=True)[values].sum().reset_index()
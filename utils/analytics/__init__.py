@@ -0,0 +1,39 @@
+"""
+Аналитические бэкенды (scikit-learn, Prophet) подключаются как плагины:
+модуль бэкенда импортируется только при первом обращении к нему,
+поэтому запуск приложения и воркеров не платит за импорт тяжёлых библиотек.
+"""
+import importlib
+import logging
+import os
+import time
+
+import diskcache
+
+import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    'anomaly': 'utils.analytics.anomaly',
+    'forecast': 'utils.analytics.forecast',
+    'cluster': 'utils.analytics.clustering',
+}
+
+# Обученные модели по (датасет, колонки, параметры). Кэш на диске: анализы выполняются
+# в отдельных процессах фоновых задач и должны видеть модели друг друга
+model_cache = diskcache.Cache(os.path.join(config.JOB_CACHE_DIR, 'models'), size_limit=config.MODEL_CACHE_BYTES)
+
+# Тяжёлые библиотеки, которые не должны импортироваться при старте приложения
+HEAVY_MODULES = ('sklearn', 'prophet', 'cmdstanpy')
+
+
+def load_backend(name):
+    """Импортирует модуль бэкенда при первом вызове; повторные вызовы берут его из sys.modules."""
+    module_name = BACKENDS[name]
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    elapsed = time.perf_counter() - started
+    if elapsed > 0.1:
+        logger.info(f"Бэкенд '{name}' загружен за {elapsed:.2f} с")
+    return module
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import IsolationForest
+
+import config
+
+
+def _isolation_forest_labels(X: np.ndarray, contamination, max_fit_samples, batch_size, n_jobs, random_state):
+    """
+    IsolationForest обучается на случайной подвыборке не больше max_fit_samples строк,
+    затем весь массив размечается батчами параллельно на всех ядрах.
+    """
+    rng = np.random.default_rng(random_state)
+    fit_rows = X if len(X) <= max_fit_samples else X[rng.choice(len(X), max_fit_samples, replace=False)]
+    model = IsolationForest(contamination=contamination, random_state=random_state, n_jobs=n_jobs)
+    model.fit(fit_rows)
+
+    # Обход деревьев идёт в Cython без GIL — потоков достаточно и батчи не копируются между процессами
+    batches = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(model.predict)(X[start:start + batch_size]) for start in range(0, len(X), batch_size)
+    )
+    return np.concatenate(batches) == -1
+
+
+def rolling_mad_labels(df: pd.DataFrame, window, threshold) -> np.ndarray:
+    """
+    Потоковая альтернатива для очень длинных рядов: робастный z-score по скользящей
+    медиане и MAD. Строка аномальна, если отклонение хотя бы в одной колонке больше threshold.
+    """
+    flags = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        series = df[col].astype(np.float64)
+        median = series.rolling(window, min_periods=1).median()
+        deviation = (series - median).abs()
+        mad = deviation.rolling(window, min_periods=1).median()
+        # 0.6745 — множитель, при котором MAD согласован со стандартным отклонением нормального распределения
+        robust_z = 0.6745 * deviation / mad.replace(0, np.nan)
+        flags |= (robust_z > threshold).fillna(False).to_numpy()
+    return flags
+
+
+def detect_anomalies(df: pd.DataFrame, columns, method='auto', contamination=0.05,
+                     max_fit_samples=None, batch_size=None, n_jobs=-1, random_state=0) -> pd.Series:
+    """
+    Обнаружение аномалий по одной или нескольким числовым колонкам.
+    Возвращает Series 0/1 (1=аномалия) с индексом df; сам df не изменяется.
+
+    method: 'isolation_forest', 'rolling_mad' или 'auto' — IsolationForest,
+    а для рядов длиннее ANOMALY_STREAMING_ROWS дешёвый rolling MAD.
+    Строки с пропусками в выбранных колонках аномалиями не считаются.
+    """
+    if isinstance(columns, str):
+        columns = [columns]
+    max_fit_samples = max_fit_samples or config.ANOMALY_MAX_FIT_SAMPLES
+    batch_size = batch_size or config.ANOMALY_BATCH_SIZE
+
+    data = df[columns]
+    valid = data.notna().all(axis=1).to_numpy()
+    labels = np.zeros(len(df), dtype=np.int8)
+
+    if method == 'auto':
+        method = 'rolling_mad' if len(df) > config.ANOMALY_STREAMING_ROWS else 'isolation_forest'
+
+    if method == 'isolation_forest':
+        X = data.to_numpy(np.float64)[valid]
+        if len(X):
+            labels[valid] = _isolation_forest_labels(X, contamination, max_fit_samples, batch_size,
+                                                     n_jobs, random_state)
+    elif method == 'rolling_mad':
+        labels[valid] = rolling_mad_labels(data[valid], config.ANOMALY_ROLLING_WINDOW,
+                                           config.ANOMALY_MAD_THRESHOLD)
+    else:
+        raise ValueError(f"Неизвестный метод поиска аномалий: {method}")
+
+    return pd.Series(labels, index=df.index, name='anomaly')
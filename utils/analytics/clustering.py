@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+import config
+from utils.analytics import model_cache
+
+
+def _chunks(n_rows, chunk_size):
+    for start in range(0, n_rows, chunk_size):
+        yield slice(start, start + chunk_size)
+
+
+def _prepare(df: pd.DataFrame, columns, medians) -> np.ndarray:
+    """Числовая матрица выбранных колонок; пропуски заполняются медианами из обучения."""
+    return df[columns].astype(np.float64).fillna(medians).to_numpy()
+
+
+def _silhouette_for_k(X_sample, k, random_state):
+    model = MiniBatchKMeans(n_clusters=k, batch_size=4096, n_init=3, random_state=random_state)
+    labels = model.fit_predict(X_sample)
+    size = min(len(X_sample), config.CLUSTER_SILHOUETTE_SAMPLES)
+    return silhouette_score(X_sample, labels, sample_size=size, random_state=random_state)
+
+
+def choose_n_clusters(X_sample, k_range, n_jobs=-1, random_state=0):
+    """Подбирает число кластеров по силуэту на выборке; кандидаты k считаются параллельно."""
+    k_range = [k for k in k_range if k < len(X_sample)]
+    if not k_range:
+        return 1
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_silhouette_for_k)(X_sample, k, random_state) for k in k_range
+    )
+    return k_range[int(np.argmax(scores))]
+
+
+def fit_clustering(df: pd.DataFrame, columns, n_clusters=None, random_state=0):
+    """
+    Обучает MiniBatchKMeans на стандартизированных признаках кусками по CLUSTER_CHUNK_ROWS строк:
+    весь массив признаков в память целиком не материализуется.
+    Если n_clusters не задан, он подбирается по силуэту на случайной выборке.
+    """
+    rng = np.random.default_rng(random_state)
+    sample_rows = rng.choice(len(df), min(len(df), config.CLUSTER_SAMPLE_ROWS), replace=False)
+    sample = df[columns].iloc[np.sort(sample_rows)]
+    medians = sample.median().fillna(0.0)
+
+    # Стандартизация: среднее и дисперсия накапливаются по кускам всего датасета
+    scaler = StandardScaler()
+    for rows in _chunks(len(df), config.CLUSTER_CHUNK_ROWS):
+        scaler.partial_fit(_prepare(df.iloc[rows], columns, medians))
+
+    X_sample = scaler.transform(_prepare(sample, columns, medians))
+    if n_clusters is None:
+        n_clusters = choose_n_clusters(X_sample, range(2, config.CLUSTER_MAX_K + 1), random_state=random_state)
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=4096, n_init=3, random_state=random_state)
+    # Центры инициализируются по случайной выборке, затем уточняются проходом по всем данным
+    kmeans.partial_fit(X_sample)
+    for rows in _chunks(len(df), config.CLUSTER_CHUNK_ROWS):
+        kmeans.partial_fit(scaler.transform(_prepare(df.iloc[rows], columns, medians)))
+
+    return {'columns': list(columns), 'medians': medians, 'scaler': scaler, 'kmeans': kmeans}
+
+
+def assign_clusters(model, df: pd.DataFrame) -> pd.Series:
+    """Назначает кластеры строкам df по уже обученной модели (например, после фильтрации)."""
+    labels = np.empty(len(df), dtype=np.int16)
+    for rows in _chunks(len(df), config.CLUSTER_CHUNK_ROWS):
+        X = model['scaler'].transform(_prepare(df.iloc[rows], model['columns'], model['medians']))
+        labels[rows] = model['kmeans'].predict(X)
+    return pd.Series(labels, index=df.index, name='cluster')
+
+
+def cluster_data(df: pd.DataFrame, columns=None, n_clusters=None, model_key=None, fit_df=None) -> pd.Series:
+    """
+    Кластеризация строк по числовым колонкам. Возвращает Series с номером кластера; df не изменяется.
+    fit_df — строки для обучения, если df лишь отфильтрованная часть датасета (по умолчанию df).
+    Если задан model_key (идентификатор датасета), обученная модель кэшируется на диске,
+    и повторные вызовы — в том числе на отфильтрованной части датасета — не переобучают её.
+    """
+    if columns is None:
+        columns = df.select_dtypes(include=[np.number]).columns.tolist()
+    if not columns:
+        raise ValueError("Нет числовых колонок для кластеризации")
+
+    cache_key = ('cluster', model_key, tuple(columns), n_clusters) if model_key else None
+    model = model_cache.get(cache_key) if cache_key else None
+    if model is None:
+        model = fit_clustering(df if fit_df is None else fit_df, columns, n_clusters)
+        if cache_key:
+            model_cache.set(cache_key, model)
+
+    return assign_clusters(model, df)
@@ -0,0 +1,156 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+
+import config
+from utils.analytics import model_cache
+
+logger = logging.getLogger(__name__)
+
+# Параметры модели Хольта (линейное экспоненциальное сглаживание) для коротких рядов
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.3
+
+
+def _time_step(ds: pd.Series) -> pd.Timedelta:
+    """Шаг ряда — медианный интервал между соседними различными датами (по умолчанию сутки)."""
+    diffs = pd.Series(np.sort(ds.unique())).diff().dropna()
+    step = diffs.median() if len(diffs) else pd.NaT
+    return step if pd.notna(step) and step > pd.Timedelta(0) else pd.Timedelta(days=1)
+
+
+def _holt_pass(y: np.ndarray):
+    """Один проход сглаживания Хольта: итоговые уровень и тренд и прогнозы на шаг вперёд."""
+    level, trend = y[0], (y[1] - y[0]) if len(y) > 1 else 0.0
+    fitted = np.empty_like(y)
+    for i, value in enumerate(y):
+        fitted[i] = level + trend
+        previous_level = level
+        level = HOLT_ALPHA * value + (1 - HOLT_ALPHA) * (level + trend)
+        trend = HOLT_BETA * (level - previous_level) + (1 - HOLT_BETA) * trend
+    return level, trend, fitted
+
+
+def fit_holt(history: pd.DataFrame) -> dict:
+    """Быстрая модель для коротких рядов: линейное экспоненциальное сглаживание Хольта на NumPy."""
+    y = history['y'].to_numpy(np.float64)
+    level, trend, fitted = _holt_pass(y)
+    residuals = y[1:] - fitted[1:]
+    return {
+        'kind': 'holt',
+        'level': float(level),
+        'trend': float(trend),
+        'sigma': float(residuals.std()) if len(residuals) else 0.0,
+    }
+
+
+def predict_holt(model: dict, history: pd.DataFrame, future_ds: pd.DatetimeIndex) -> pd.DataFrame:
+    steps = np.arange(1, len(future_ds) + 1)
+    yhat = model['level'] + model['trend'] * steps
+    spread = 1.96 * model['sigma'] * np.sqrt(steps)
+    _, _, fitted = _holt_pass(history['y'].to_numpy(np.float64))
+    return pd.DataFrame({
+        'ds': np.concatenate([history['ds'].to_numpy(), future_ds.to_numpy()]),
+        'yhat': np.concatenate([fitted, yhat]),
+        'yhat_lower': np.concatenate([fitted, yhat - spread]),
+        'yhat_upper': np.concatenate([fitted, yhat + spread]),
+    })
+
+
+def _fit_and_predict(group, history: pd.DataFrame, periods, model):
+    """
+    Задача для пула процессов: обучает модель одной группы (если её нет в кэше) и строит прогноз.
+    Возвращает (группа, модель для кэша или None, прогноз).
+    """
+    step = _time_step(history['ds'])
+    future_ds = pd.date_range(history['ds'].iloc[-1] + step, periods=periods, freq=step)
+
+    new_model = None
+    if model is None:
+        if len(history) < config.FORECAST_MIN_HISTORY:
+            model = new_model = fit_holt(history)
+        else:
+            prophet = Prophet()
+            prophet.fit(history)
+            model = new_model = {'kind': 'prophet', 'json': model_to_json(prophet)}
+
+    if model['kind'] == 'holt':
+        forecast = predict_holt(model, history, future_ds)
+    else:
+        prophet = model_from_json(model['json'])
+        future = pd.DataFrame({'ds': pd.concat([history['ds'], pd.Series(future_ds)], ignore_index=True)})
+        forecast = prophet.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+    return group, new_model, forecast
+
+
+def sum_by_date(df, date_col, value_col, group_col=None) -> pd.DataFrame:
+    """
+    Ряды, на которых обучается прогноз: значения с одной датой (в группе) суммируются.
+    Колонки ds, y (и group_col), строки отсортированы по группе и дате.
+    """
+    columns = [date_col, value_col] + ([group_col] if group_col else [])
+    data = df[columns].dropna().rename(columns={date_col: 'ds', value_col: 'y'})
+    data['ds'] = pd.to_datetime(data['ds'])
+    keys = [group_col, 'ds'] if group_col else ['ds']
+    return data.groupby(keys, as_index=False, sort=True, observed=True)['y'].sum()
+
+
+def forecast_time_series(df, date_col, value_col, periods=30, group_col=None, model_key=None, history=None):
+    """
+    Прогнозирование временных рядов, при group_col — отдельно для каждой группы.
+
+    Группы обучаются параллельно в пуле процессов. Для групп короче FORECAST_MIN_HISTORY
+    вместо Prophet используется быстрая модель Хольта. Если задан model_key (идентификатор
+    датасета), обученные модели кэшируются по (датасет, колонки, группа): повторный прогноз
+    и смена горизонта не переобучают модели.
+
+    Несколько строк с одной датой в группе (выгрузки по товарам и магазинам) суммируются:
+    модель обучается на одном значении на дату (см. sum_by_date; готовый результат можно
+    передать в history, чтобы не агрегировать df повторно).
+
+    Возвращает DataFrame с колонками ds, yhat, yhat_lower, yhat_upper (и group_col для групп).
+    """
+    if history is None:
+        history = sum_by_date(df, date_col, value_col, group_col)
+
+    if group_col:
+        # Прогнозируются самые длинные ряды
+        top_groups = history[group_col].value_counts().index[:config.FORECAST_MAX_GROUPS]
+        groups = [(group, part[['ds', 'y']].reset_index(drop=True)) for group, part in
+                  history[history[group_col].isin(top_groups)].groupby(group_col, observed=True)]
+    else:
+        groups = [(None, history)]
+
+    tasks = []
+    for group, history in groups:
+        key = ('forecast', model_key, date_col, value_col, group_col, group,
+               config.FORECAST_MIN_HISTORY, 'sum') if model_key else None
+        tasks.append((key, group, history, model_cache.get(key) if key else None))
+
+    if len(tasks) == 1:
+        results = [_fit_and_predict(group, history, periods, model) for _, group, history, model in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=config.FORECAST_WORKERS or os.cpu_count()) as pool:
+            results = list(pool.map(_fit_and_predict,
+                                    [group for _, group, _, _ in tasks],
+                                    [history for _, _, history, _ in tasks],
+                                    [periods] * len(tasks),
+                                    [model for _, _, _, model in tasks]))
+
+    forecasts = []
+    for (key, _, _, _), (group, new_model, forecast) in zip(tasks, results):
+        if key and new_model is not None:
+            model_cache.set(key, new_model)
+        if group_col:
+            forecast.insert(0, group_col, group)
+        forecasts.append(forecast)
+
+    fitted = sum(1 for _, new_model, _ in results if new_model is not None)
+    logger.info(f"Прогноз: групп {len(results)}, обучено моделей {fitted}, из кэша {len(results) - fitted}")
+    return pd.concat(forecasts, ignore_index=True)
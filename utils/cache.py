@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением по количеству элементов и по объёму.
+    Размер элемента вычисляется функцией sizeof (в байтах).
+    """
+
+    def __init__(self, max_items, max_bytes, sizeof):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            # Элемент больше всего бюджета не кэшируем
+            if size > self.max_bytes:
+                return False
+            self._items[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            self._evict()
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value = self._items[key]
+            self._remove(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._items),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key):
+        del self._items[key]
+        self.total_bytes -= self._sizes.pop(key)
+
+    def _evict(self):
+        while self._items and (len(self._items) > self.max_items or self.total_bytes > self.max_bytes):
+            oldest = next(iter(self._items))
+            self._remove(oldest)
+            self.evictions += 1
@@ -0,0 +1,149 @@
+"""
+Профиль колонок датасета: считается один раз при загрузке (см. utils.schema.optimize_schema)
+и хранится в описании датасета и в его описании в dcc.Store. Списки осей, размер пузырьков,
+рекомендации типов графиков и проверка пропусков берут статистику отсюда, не сканируя данные.
+
+    {'колонка': {'dtype': 'float32', 'kind': 'numeric', 'nulls': 12, 'cardinality': None,
+                 'distinct_approx': 9870, 'min': 0.5, 'max': 99.1,
+                 'quantiles': {'0.25': ..., '0.5': ..., '0.75': ...}}}
+
+kind — 'numeric', 'datetime', 'categorical', 'bool' или 'text'. cardinality — точное число
+различных значений, если оно известно без подсчёта (категории, bool), иначе None;
+distinct_approx — оценка числа различных значений (KMV) для любой колонки.
+"""
+import numpy as np
+import pandas as pd
+
+import config
+from utils.dataset_cache import dataset_cache
+
+KIND_LABELS = {'numeric': 'число', 'datetime': 'дата', 'categorical': 'категория', 'bool': 'да/нет',
+               'text': 'текст'}
+
+
+def column_kind(column: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(column):
+        return 'bool'
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return 'categorical'
+    if pd.api.types.is_numeric_dtype(column):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return 'datetime'
+    return 'text'
+
+
+def approx_distinct(column: pd.Series, k=None) -> int:
+    """
+    Оценка числа различных значений методом k минимальных значений (KMV): по 64-битным
+    хэшам значений хранятся только k наименьших различных, число различных ≈ (k - 1) / x_k,
+    где x_k — k-й наименьший хэш, нормированный в [0, 1). Погрешность порядка 1/sqrt(k),
+    память O(k). Если различных значений меньше k, ответ точный.
+    """
+    k = k or config.COLUMN_PROFILE_DISTINCT_K
+    max_hash = np.iinfo(np.uint64).max
+    smallest = np.empty(0, dtype=np.uint64)
+    values = column.dropna()
+    for start in range(0, len(values), config.COLUMN_PROFILE_CHUNK_ROWS):
+        hashes = pd.util.hash_pandas_object(values.iloc[start:start + config.COLUMN_PROFILE_CHUNK_ROWS],
+                                            index=False).to_numpy()
+        # Хэши распределены равномерно: сначала берём только малую долю наименьших и
+        # расширяем порог, пока не наберётся k различных (или пока не пройдёт весь кусок)
+        if len(smallest) == k:
+            threshold = smallest[-1]
+        else:
+            threshold = np.uint64(min(max_hash, 4 * k * (max_hash // len(hashes))))
+        while True:
+            merged = np.unique(np.concatenate([smallest, pd.unique(hashes[hashes <= threshold])]))
+            # Набранные раньше хэши выше порога не в счёт: между ними и порогом могут быть хэши куска
+            if np.count_nonzero(merged <= threshold) >= k or threshold == max_hash:
+                break
+            threshold = np.uint64(max_hash if threshold > max_hash // 16 else threshold * 16)
+        smallest = merged[:k]
+    if len(smallest) < k:
+        return len(smallest)
+    return int(round((k - 1) / (float(smallest[-1]) / 2 ** 64)))
+
+
+def _order_stats(values: np.ndarray):
+    """min, max и квантили значений без пропусков."""
+    if not len(values):
+        return None, None, {}
+    quantiles = np.quantile(values, config.COLUMN_PROFILE_QUANTILES)
+    return values.min(), values.max(), dict(zip(map(str, config.COLUMN_PROFILE_QUANTILES), quantiles))
+
+
+def profile_column(column: pd.Series) -> dict:
+    kind = column_kind(column)
+    nulls = int(column.isna().sum())
+    profile = {'dtype': str(column.dtype), 'kind': kind, 'nulls': nulls, 'cardinality': None}
+
+    if kind == 'categorical':
+        codes = column.cat.codes.to_numpy()
+        profile['cardinality'] = int(np.count_nonzero(np.bincount(codes[codes >= 0],
+                                                                   minlength=len(column.cat.categories))))
+    elif kind == 'bool':
+        profile['cardinality'] = int(column.dropna().nunique())
+    profile['distinct_approx'] = profile['cardinality'] if profile['cardinality'] is not None \
+        else approx_distinct(column)
+
+    if kind == 'numeric':
+        values = column.to_numpy(np.float64, na_value=np.nan)
+        low, high, quantiles = _order_stats(values[~np.isnan(values)])
+        profile['min'] = None if low is None else float(low)
+        profile['max'] = None if high is None else float(high)
+        profile['quantiles'] = {q: float(value) for q, value in quantiles.items()}
+    elif kind == 'datetime':
+        # Даты считаются в наносекундах и сохраняются строками ISO
+        values = column.to_numpy('datetime64[ns]')
+        low, high, quantiles = _order_stats(values[~np.isnat(values)].astype(np.int64))
+
+        def iso(value):
+            return None if value is None else pd.Timestamp(int(value)).isoformat()
+        profile['min'], profile['max'] = iso(low), iso(high)
+        profile['quantiles'] = {q: iso(value) for q, value in quantiles.items()}
+    return profile
+
+
+def profile_columns(df: pd.DataFrame) -> dict:
+    """Профиль всех колонок; каждая колонка обрабатывается векторно за один проход."""
+    return {str(col): profile_column(df[col]) for col in df.columns}
+
+
+def dataset_profile(dataset_id, df: pd.DataFrame) -> dict:
+    """Профиль из описания датасета; для датасетов, сохранённых без профиля, считается заново."""
+    meta = dataset_cache.get_meta(dataset_id) or {}
+    profile = (meta.get('schema') or {}).get('profile')
+    return profile if profile is not None else profile_columns(df)
+
+
+def columns_of_kind(profile: dict, *kinds) -> list:
+    return [col for col, column_profile in profile.items() if column_profile['kind'] in kinds]
+
+
+def axis_options(profile: dict) -> list:
+    """Опции выпадающих списков осей: имя колонки с её типом."""
+    return [{'label': f"{col} ({KIND_LABELS[column_profile['kind']]})", 'value': col}
+            for col, column_profile in profile.items()]
+
+
+def recommend_graph_types(profile: dict, x_axis, y_axis=None) -> list:
+    """Типы графиков, которые лучше всего подходят выбранным осям, по их типам и числу значений."""
+    x = profile.get(x_axis)
+    if x is None:
+        return []
+    y = profile.get(y_axis) if y_axis else None
+    x_is_category = x['kind'] in ('categorical', 'bool', 'text')
+    few_categories = x_is_category and x['distinct_approx'] <= config.PIE_MAX_CATEGORIES
+
+    if y is None:
+        if x_is_category:
+            return ['pie', 'bar'] if few_categories else ['bar']
+        return ['histogram', 'box']
+    if y['kind'] != 'numeric':
+        return ['sankey'] if x_is_category and y['kind'] in ('categorical', 'bool', 'text') else []
+    if x['kind'] == 'datetime':
+        return ['line', 'bar', 'combo']
+    if x_is_category:
+        return ['pie', 'bar', 'box'] if few_categories else ['bar', 'box']
+    return ['scatter', 'heatmap', 'bubble', 'line']
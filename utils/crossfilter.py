@@ -0,0 +1,249 @@
+"""
+Перекрёстная фильтрация: выделение (box/lasso) или клик на одном графике
+фильтрует данные для остальных графиков, таблицы и AI-анализа.
+
+Фильтр хранится в dcc.Store 'crossfilter' по графику-источнику:
+
+    {'dataset_id': ..., 'source': 'graph', 'filters': {'graph': [условие, ...], ...}}
+
+Условия: {'column', 'range': [от, до]} — для чисел и дат, {'column', 'values': [...]} —
+для категорий, {'columns': [x, y], 'polygon': [[x...], [y...]]} — лассо по двум числовым колонкам.
+
+Условия проверяются по индексам колонок, которые строятся один раз на (датасет, колонка):
+отсортированные значения с перестановкой для диапазонов и битовые карты категория -> строки
+для категорий. Маска по фильтру стоит O(число отобранных строк), без прохода по колонке.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.aggregation import OTHER_LABEL, box_categories
+from utils.cache import LRUCache
+
+# Графики, у которых ось Y — значения колонки, а не агрегат (сумма, количество)
+Y_IS_COLUMN = {'line', 'scatter', 'bubble', 'combo', 'heatmap', 'box'}
+
+
+def _is_range_column(column: pd.Series) -> bool:
+    if isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(column):
+        return False
+    return pd.api.types.is_numeric_dtype(column) or pd.api.types.is_datetime64_any_dtype(column)
+
+
+def _range_values(column: pd.Series) -> np.ndarray:
+    """Значения для сравнения диапазоном: числа — float64, даты — наносекунды int64."""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.to_numpy('datetime64[ns]').astype(np.int64).astype(np.float64)
+        values[column.isna().to_numpy()] = np.nan
+        return values
+    return column.to_numpy(np.float64, na_value=np.nan)
+
+
+def _range_bound(column: pd.Series, value) -> float:
+    """Граница выделения plotly (число или строка даты) в единицах _range_values."""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return float(pd.Timestamp(value).value)
+    return float(value)
+
+
+class ColumnIndex:
+    """
+    Индекс одной колонки.
+    Числа и даты: перестановка, сортирующая колонку, и отсортированные значения (без NaN) —
+    диапазон находится двоичным поиском. Категории: по битовой карте строк на категорию
+    (упакованной, n/8 байт); при большом числе категорий вместо карт — строки,
+    сгруппированные по категориям, со смещениями групп.
+    """
+
+    def __init__(self, column: pd.Series):
+        self.n_rows = len(column)
+        position_dtype = np.int32 if self.n_rows < 2 ** 31 else np.int64
+        if _is_range_column(column):
+            self.kind = 'range'
+            values = _range_values(column)
+            order = np.argsort(values, kind='stable')
+            n_valid = int(np.count_nonzero(~np.isnan(values)))  # NaN сортируются в конец
+            self.order = order[:n_valid].astype(position_dtype)
+            self.sorted_values = values[self.order]
+            return
+
+        self.kind = 'categorical'
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, categories = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, categories = pd.factorize(column)
+        self.categories = {str(value): i for i, value in enumerate(categories)}
+        if len(categories) <= config.CROSSFILTER_BITMAP_MAX_CATEGORIES:
+            self.bitmaps = np.stack([np.packbits(codes == i) for i in range(len(categories))]) \
+                if len(categories) else np.zeros((0, (self.n_rows + 7) // 8), dtype=np.uint8)
+        else:
+            self.bitmaps = None
+            self.order = np.argsort(codes, kind='stable').astype(position_dtype)
+            counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+            n_missing = int(np.count_nonzero(codes < 0))  # пропуски (код -1) — в начале перестановки
+            self.offsets = n_missing + np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def nbytes(self):
+        arrays = [getattr(self, name, None) for name in ('order', 'sorted_values', 'bitmaps', 'offsets')]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def range_mask(self, low, high) -> np.ndarray:
+        start = np.searchsorted(self.sorted_values, low, side='left')
+        end = np.searchsorted(self.sorted_values, high, side='right')
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.order[start:end]] = True
+        return mask
+
+    def values_mask(self, values) -> np.ndarray:
+        codes = [self.categories[str(value)] for value in values if str(value) in self.categories]
+        if self.bitmaps is not None:
+            if not codes:
+                return np.zeros(self.n_rows, dtype=bool)
+            packed = np.bitwise_or.reduce(self.bitmaps[codes], axis=0)
+            return np.unpackbits(packed, count=self.n_rows).view(bool)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for code in codes:
+            mask[self.order[self.offsets[code]:self.offsets[code + 1]]] = True
+        return mask
+
+
+_index_cache = LRUCache(config.CROSSFILTER_INDEX_MAX_ITEMS, config.CROSSFILTER_INDEX_MAX_BYTES,
+                        lambda index: index.nbytes)
+
+
+def column_index(dataset_id, df: pd.DataFrame, column: str) -> ColumnIndex:
+    """Индекс колонки датасета; строится при первом обращении и кэшируется."""
+    key = (dataset_id, column)
+    index = _index_cache.get(key)
+    if index is None:
+        index = ColumnIndex(df[column])
+        _index_cache.put(key, index)
+    return index
+
+
+def _points_in_polygon(x: np.ndarray, y: np.ndarray, polygon_x, polygon_y) -> np.ndarray:
+    """Векторизованная проверка «точка внутри многоугольника» (метод лучей)."""
+    inside = np.zeros(len(x), dtype=bool)
+    px, py = np.asarray(polygon_x, dtype=np.float64), np.asarray(polygon_y, dtype=np.float64)
+    for x1, y1, x2, y2 in zip(px, py, np.roll(px, -1), np.roll(py, -1)):
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def _condition_mask(dataset_id, df, condition) -> np.ndarray:
+    if 'polygon' in condition:
+        x_col, y_col = condition['columns']
+        polygon_x, polygon_y = condition['polygon']
+        # Индексы сужают проверку до строк в описанном прямоугольнике лассо
+        mask = column_index(dataset_id, df, x_col).range_mask(min(polygon_x), max(polygon_x))
+        mask &= column_index(dataset_id, df, y_col).range_mask(min(polygon_y), max(polygon_y))
+        rows = np.flatnonzero(mask)
+        x = _range_values(df[x_col].iloc[rows])
+        y = _range_values(df[y_col].iloc[rows])
+        mask[rows] = _points_in_polygon(x, y, polygon_x, polygon_y)
+        return mask
+
+    index = column_index(dataset_id, df, condition['column'])
+    if 'range' in condition:
+        return index.range_mask(*condition['range'])
+    return index.values_mask(condition['values'])
+
+
+def active_filters(crossfilter, dataset_id, exclude=None) -> list:
+    """Условия всех графиков, кроме exclude: график не фильтрует сам себя."""
+    if not crossfilter or crossfilter.get('dataset_id') != dataset_id:
+        return []
+    return [condition for source, conditions in sorted(crossfilter['filters'].items())
+            if source != exclude for condition in conditions]
+
+
+def condition_columns(conditions) -> list:
+    """Колонки, по которым отбирают условия фильтра."""
+    columns = []
+    for condition in conditions or []:
+        columns.extend(condition.get('columns') or [condition['column']])
+    return list(dict.fromkeys(columns))
+
+
+def filters_key(conditions) -> str:
+    """Короткий ключ набора условий для кэшей фигур, страниц таблицы и результатов анализа."""
+    if not conditions:
+        return ''
+    return hashlib.sha256(json.dumps(conditions, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def crossfilter_mask(dataset_id, df: pd.DataFrame, conditions):
+    """Булева маска строк, удовлетворяющих всем условиям; None — фильтра нет."""
+    mask = None
+    for condition in conditions:
+        condition_mask = _condition_mask(dataset_id, df, condition)
+        mask = condition_mask if mask is None else mask & condition_mask
+    return mask
+
+
+def apply_crossfilter(dataset_id, df: pd.DataFrame, conditions) -> pd.DataFrame:
+    mask = crossfilter_mask(dataset_id, df, conditions)
+    return df if mask is None else df[mask]
+
+
+def selection_conditions(df: pd.DataFrame, graph_type, x_axis, y_axis, selected_data=None, click_data=None):
+    """
+    Переводит выделение (selectedData) или клик (clickData) на графике в условия по колонкам.
+    Для числовых осей берётся диапазон выделения (или многоугольник лассо), для категориальных —
+    значения выделенных точек (столбцов, секторов). Пустой список — выделение снято.
+    Сводная группа OTHER_LABEL (редкие категории) не отбирает строк.
+    """
+    y_is_range = graph_type in Y_IS_COLUMN and y_axis in df.columns and _is_range_column(df[y_axis])
+    # Секторы круговой диаграммы с нечисловым y подписаны значениями y (см. build_figure)
+    if graph_type == 'pie' and y_axis in df.columns and not pd.api.types.is_numeric_dtype(df[y_axis]):
+        x_axis = y_axis
+    x_is_range = x_axis in df.columns and _is_range_column(df[x_axis])
+
+    if click_data:
+        # Клик имеет смысл только по категории: столбец, сектор круговой диаграммы, ящик
+        point = click_data['points'][0]
+        value = point.get('label', point.get('x'))
+        if x_axis in df.columns and not x_is_range and value is not None and value != OTHER_LABEL:
+            return [{'column': x_axis, 'values': [value]}]
+        return []
+
+    if not selected_data:
+        return []
+
+    if 'lassoPoints' in selected_data and x_is_range and y_is_range:
+        lasso = selected_data['lassoPoints']
+        return [{'columns': [x_axis, y_axis],
+                 'polygon': [[_range_bound(df[x_axis], v) for v in lasso['x']],
+                             [_range_bound(df[y_axis], v) for v in lasso['y']]]}]
+
+    conditions = []
+    box = selected_data.get('range') or {}
+    points = selected_data.get('points') or []
+    if graph_type == 'box' and x_axis in df.columns and y_axis in df.columns:
+        # Ящики построены по готовой статистике: в points попадают только выбросы,
+        # поэтому категории берутся по позициям ящиков в диапазоне выделения
+        categories = box_categories(df, x_axis, y_axis)
+        if categories is not None:
+            points = []
+            if 'x' in box:
+                low, high = sorted(box['x'])
+                first, last = max(int(np.ceil(low - 0.5)), 0), int(np.floor(high + 0.5))
+                points = [{'x': name} for name in categories[first:last + 1]]
+            x_is_range = False
+    if x_is_range and 'x' in box:
+        conditions.append({'column': x_axis, 'range': sorted(_range_bound(df[x_axis], v) for v in box['x'])})
+    elif not x_is_range and x_axis in df.columns and points:
+        values = {point.get('label', point.get('x')) for point in points}
+        values = sorted(str(value) for value in values if value is not None and value != OTHER_LABEL)
+        if values:
+            conditions.append({'column': x_axis, 'values': values})
+    if y_is_range and 'y' in box:
+        conditions.append({'column': y_axis, 'range': sorted(_range_bound(df[y_axis], v) for v in box['y'])})
+    return conditions
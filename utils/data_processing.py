@@ -2,36 +2,294 @@ import base64
 import csv
 import io
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
 
 import numpy as np
 import pandas as pd
-from prophet import Prophet
-from sklearn.cluster import KMeans
-from sklearn.ensemble import IsolationForest
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+import config
+from utils.dataset_cache import dataset_cache, dataset_id_from_hasher, get_dataframe, new_content_hasher
+from utils.excel import (excel_extension, is_excel, read_sheet, save_workbook, sheet_dataset_id,
+                         sheet_names, split_sheet_dataset_id, workbook_path)
+from utils.instrumentation import peak_rss, stage
+from utils.schema import downcast_numeric, optimize_schema
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def validate_dataframe(df: pd.DataFrame) -> None:
-    """Проверка качества данных перед построением графиков."""
+def validate_dataframe(df: pd.DataFrame, profile: dict) -> None:
+    """Проверка качества данных перед построением графиков; пропуски берутся из профиля колонок."""
     if df.empty:
         raise ValueError("Файл не содержит данных")
-    if df.isnull().values.any():
-        logger.warning("Обнаружены пропущенные значения в данных")
-
-
-def parse_csv_with_commas(content):
-    """Обработка CSV с запятыми в полях"""
-    rows = []
-    reader = csv.reader(io.StringIO(content), quotechar='"')
-    for row in reader:
-        if len(row) > 4:
-            fixed_row = row[:3] + [', '.join(row[3:])]
-            rows.append(fixed_row)
+    with_nulls = {col: column_profile['nulls'] for col, column_profile in profile.items() if column_profile['nulls']}
+    if with_nulls:
+        logger.warning(f"Обнаружены пропущенные значения в данных: "
+                       f"{', '.join(f'{col} ({count})' for col, count in with_nulls.items())}")
+
+
+def _repair_row(fields, width, merge_index, separator):
+    """Приводит строку к ширине заголовка: лишние поля склеиваются в колонку merge_index."""
+    if len(fields) > width:
+        tail = width - merge_index - 1
+        merged = separator.join(fields[merge_index:len(fields) - tail])
+        return fields[:merge_index] + [merged] + fields[len(fields) - tail:]
+    return fields + [None] * (width - len(fields))
+
+
+def infer_column_types(table: pa.Table) -> pd.DataFrame:
+    """
+    Строковые колонки, где все непустые значения — числа, приводятся к int64/float64
+    средствами Arrow (без построчного Python), затем разрядность уменьшается.
+    """
+    columns = []
+    for column in table.columns:
+        for target in (pa.int64(), pa.float64()):
+            try:
+                # Неудачное приведение всей колонки дорогое — сначала проверяем начало колонки
+                pc.cast(column.slice(0, 1000), target)
+                column = pc.cast(column, target)
+                break
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                continue
+        columns.append(column)
+    df = pa.Table.from_arrays(columns, names=table.column_names).to_pandas()
+    return downcast_numeric(df)
+
+
+def parse_csv_with_commas(content, merge_column=None, separator=', '):
+    """
+    Разбор CSV, в котором у части строк полей больше, чем в заголовке
+    (например, неэкранированные запятые в тексте).
+
+    Корректные строки разбирает pyarrow, некорректные перехватываются через
+    invalid_row_handler: лишние поля склеиваются в колонку merge_column
+    (по умолчанию — последнюю), недостающие заполняются пустыми значениями.
+    После склейки числовые колонки получают числовые типы.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    header = next(csv.reader(io.StringIO(content[:content.find(b'\n')].decode('utf-8').strip('\r'))))
+    width = len(header)
+    if merge_column is None:
+        merge_index = width - 1
+    elif isinstance(merge_column, int):
+        merge_index = merge_column
+    else:
+        merge_index = header.index(merge_column)
+
+    bad_rows = []
+
+    def collect_invalid(row):
+        bad_rows.append((row.number, row.text))
+        return 'skip'
+
+    names = [f"f{i}" for i in range(width)]
+    table = pacsv.read_csv(
+        io.BytesIO(content),
+        # Номера строк pyarrow отдаёт только при однопоточном разборе
+        read_options=pacsv.ReadOptions(use_threads=False, column_names=names, skip_rows=1),
+        parse_options=pacsv.ParseOptions(invalid_row_handler=collect_invalid, newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in names},
+                                             strings_can_be_null=True),
+    )
+
+    if bad_rows:
+        repaired_rows = [_repair_row(fields, width, merge_index, separator)
+                         for fields in csv.reader([text for _, text in bad_rows])]
+        repaired = pa.Table.from_arrays(
+            [pa.array([row[i] for row in repaired_rows], pa.string()) for i in range(width)], names=names)
+
+        # number — порядковый номер записи (с заголовком): восстанавливаем исходный порядок строк
+        numbers = np.array([number for number, _ in bad_rows])
+        good_before = numbers - 2 - np.arange(len(numbers))
+        order = np.argsort(np.concatenate([np.arange(table.num_rows), good_before - 0.5]), kind='stable')
+        table = pa.concat_tables([table, repaired]).take(order)
+        logger.warning(f"Исправлено некорректных строк CSV: {len(bad_rows)}")
+
+    df = infer_column_types(table)
+    df.columns = header
+    return df
+
+
+def _decode_contents(contents: str, hasher=None) -> tuple:
+    """
+    Разбирает data URL от dcc.Upload на MIME-тип и буфер с байтами файла.
+    base64 декодируется кусками, без копии всей строки и без промежуточного str,
+    попутно (если передан hasher) считается хэш содержимого.
+    """
+    header_end = contents.index(',')
+    content_type = contents[:header_end]
+
+    buffer = io.BytesIO()
+    for start in range(header_end + 1, len(contents), config.BASE64_CHUNK_CHARS):
+        chunk = base64.b64decode(contents[start:start + config.BASE64_CHUNK_CHARS])
+        if hasher is not None:
+            hasher.update(chunk)
+        buffer.write(chunk)
+    buffer.seek(0)
+    return content_type, buffer
+
+
+def _unify_chunk_dtypes(chunks) -> None:
+    """
+    Типы колонок pandas выводит по каждому куску отдельно: колонка может быть числовой
+    в первых кусках и строковой дальше. Склейка дала бы смесь int и str в одной колонке
+    (её не сохранить в Arrow и не отсортировать), поэтому такие колонки целиком приводятся
+    к строкам, как при чтении файла одним куском. Пропуски остаются пропусками.
+    """
+    for col in chunks[0].columns:
+        if len({chunk[col].dtype == object for chunk in chunks}) < 2:
+            continue
+        for chunk in chunks:
+            column = chunk[col]
+            if column.dtype != object:
+                chunk[col] = column.astype(object).where(column.isna(), column.astype(str))
+
+
+def read_csv_chunked(source) -> pd.DataFrame:
+    """
+    Потоковый разбор CSV из байтового буфера или файла: pandas читает кусками по
+    CSV_CHUNK_ROWS строк, и каждый кусок сразу уменьшается в разрядности.
+    """
+    # low_memory=False: внутри куска тип колонки выводится по всему куску, а не по его частям
+    chunks = [downcast_numeric(chunk) for chunk in
+              pd.read_csv(source, chunksize=config.CSV_CHUNK_ROWS, encoding='utf-8', low_memory=False)]
+    if not chunks:
+        return pd.DataFrame()
+    _unify_chunk_dtypes(chunks)
+    df = pd.concat(chunks, ignore_index=True, copy=False)
+    # После склейки кусков с разной разрядностью pandas приводит к общему типу — ужимаем ещё раз
+    return downcast_numeric(df)
+
+
+@contextmanager
+def measure_parse(label: str):
+    """
+    Замеряет время и пиковый прирост RSS процесса на время разбора файла.
+    RSS опрашивается фоновым потоком: в отличие от tracemalloc это не замедляет
+    разбор колонок с миллионами строковых объектов.
+    """
+    stats = {'label': label}
+    memory = peak_rss() if config.TRACK_PARSE_MEMORY else nullcontext({})
+    started = time.perf_counter()
+    try:
+        with memory as memory_stats:
+            yield stats
+    finally:
+        stats['seconds'] = time.perf_counter() - started
+        if config.TRACK_PARSE_MEMORY:
+            stats['peak_bytes'] = memory_stats['peak_bytes']
+            logger.info(f"Разбор {label}: {stats['seconds']:.2f} с, "
+                        f"пик памяти +{stats['peak_bytes'] / 1024 ** 2:.1f} МБ")
         else:
-            rows.append(row)
-    return pd.DataFrame(rows[1:], columns=rows[0])
+            logger.info(f"Разбор {label}: {stats['seconds']:.2f} с")
+
+
+def _read_bytes(source) -> bytes:
+    if isinstance(source, io.BytesIO):
+        return source.getvalue()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _parse_decoded(content_type: str, source):
+    """
+    Разбирает файл (байтовый буфер или путь к файлу на диске) и оптимизирует
+    типы колонок. Возвращает (df, схема).
+    """
+    if 'csv' in content_type:
+        try:
+            df = read_csv_chunked(source)
+        except pd.errors.ParserError:
+            df = parse_csv_with_commas(_read_bytes(source), config.CSV_MERGE_COLUMN)
+    elif is_excel(content_type):
+        df = read_sheet(source)
+    else:
+        raise ValueError("Неподдерживаемый формат файла")
+    return _prepare_frame(df)
+
+
+def _prepare_frame(df: pd.DataFrame):
+    # Колоночное хранилище требует строковые имена колонок
+    df.columns = df.columns.map(str)
+    df, schema = optimize_schema(df)
+    validate_dataframe(df, schema['profile'])  # Добавляем валидацию
+    return df, schema
+
+
+def _parse_sheet(path, sheet, dataset_id, meta):
+    """
+    Задача для пула процессов: разбирает один лист книги и сохраняет его в колоночное
+    хранилище под собственным идентификатором. DataFrame возвращается в родительский
+    процесс, только если записать его на диск не удалось.
+    """
+    with measure_parse(f"{dataset_id} ({sheet})") as stats:
+        df, schema = _prepare_frame(read_sheet(path, sheet))
+    store = dataset_cache.store
+    store.write_meta(dataset_id, {**meta, 'sheet': sheet, 'schema': schema, 'parse': stats})
+    return None if store.write(dataset_id, df) else df
+
+
+def _load_workbook(workbook_id, content_type, source) -> pd.DataFrame:
+    """
+    Разбирает все листы книги Excel, каждый кэшируется отдельно (см. sheet_dataset_id).
+    Листы разбираются параллельно в процессах; книга сохраняется рядом с данными.
+    Возвращает DataFrame первого листа.
+    """
+    df = dataset_cache.get(workbook_id)
+    if df is not None:
+        return df
+
+    path = save_workbook(source, workbook_id, excel_extension(content_type))
+    names = sheet_names(path)
+    ids = [sheet_dataset_id(workbook_id, i) for i in range(len(names))]
+    meta = {'workbook': workbook_id,
+            'sheets': [{'label': name, 'value': dataset_id} for name, dataset_id in zip(names, ids)]}
+
+    missing = [(name, dataset_id) for name, dataset_id in zip(names, ids) if dataset_id not in dataset_cache]
+    if len(missing) == 1:
+        results = [_parse_sheet(path, missing[0][0], missing[0][1], meta)]
+    else:
+        workers = min(len(missing), config.EXCEL_WORKERS or os.cpu_count())
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_parse_sheet, [path] * len(missing), [name for name, _ in missing],
+                                    [dataset_id for _, dataset_id in missing], [meta] * len(missing)))
+
+    for (_, dataset_id), sheet_df in zip(missing, results):
+        if sheet_df is not None:
+            dataset_cache.put(dataset_id, sheet_df)
+    logger.info(f"Книга {workbook_id}: листов {len(names)}, разобрано {len(missing)}")
+    return get_dataframe(workbook_id)
+
+
+def _reload_sheet(dataset_id, columns):
+    """
+    Загрузчик для кэша датасетов: если лист книги вытеснен из кэша и колоночного
+    хранилища, а сама книга ещё сохранена, перечитывает из неё только нужные колонки.
+    """
+    workbook_id, index = split_sheet_dataset_id(dataset_id)
+    path = workbook_path(workbook_id)
+    if path is None:
+        return None
+    df = read_sheet(path, index, usecols=columns)
+    df.columns = df.columns.map(str)
+    df, schema = optimize_schema(df)
+    if columns is None:
+        meta = dataset_cache.get_meta(dataset_id) or {}
+        dataset_cache.put(dataset_id, df, meta={**meta, 'schema': schema})
+    logger.info(f"Лист {dataset_id} перечитан из книги, колонки: {columns or 'все'}")
+    return df
+
+
+dataset_cache.register_loader(_reload_sheet)
 
 
 def process_uploaded_file(contents: str) -> pd.DataFrame:
@@ -40,20 +298,8 @@ def process_uploaded_file(contents: str) -> pd.DataFrame:
         raise ValueError("Не получены данные файла")
 
     try:
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-
-        if 'csv' in content_type:
-            try:
-                df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-            except pd.errors.ParserError:
-                df = parse_csv_with_commas(decoded.decode('utf-8'))
-        elif 'xls' in content_type:
-            df = pd.read_excel(io.BytesIO(decoded))
-        else:
-            raise ValueError("Неподдерживаемый формат файла")
-
-        validate_dataframe(df)  # Добавляем валидацию
+        content_type, buffer = _decode_contents(contents)
+        df, _ = _parse_decoded(content_type, buffer)
         return df
 
     except Exception as e:
@@ -61,27 +307,51 @@ def process_uploaded_file(contents: str) -> pd.DataFrame:
         raise ValueError(f"Ошибка обработки файла: {str(e)}")
 
 
-def detect_anomalies(df, column):
-    """Обнаружение аномалий в указанной колонке"""
-    model = IsolationForest(contamination=0.05)
-    df['anomaly'] = model.fit_predict(df[[column]])
-    df['anomaly'] = df['anomaly'].map({1: 0, -1: 1})  # 1=аномалия
-    return df
+def load_dataset(contents: str):
+    """
+    Разбирает загруженный файл один раз и кладёт результат в кэш датасетов.
+    Возвращает (dataset_id, DataFrame). Повторная загрузка того же файла берётся из кэша.
+    """
+    if contents is None:
+        raise ValueError("Не получены данные файла")
 
+    try:
+        hasher = new_content_hasher()
+        with stage('decode'):
+            content_type, buffer = _decode_contents(contents, hasher)
+        dataset_id = dataset_id_from_hasher(hasher)
+
+        return dataset_id, _cached_parse(dataset_id, content_type, buffer)
 
-def forecast_time_series(df, date_col, value_col, periods=30):
-    """Прогнозирование временных рядов"""
-    df = df.rename(columns={date_col: 'ds', value_col: 'y'})
-    model = Prophet()
-    model.fit(df)
-    future = model.make_future_dataframe(periods=periods)
-    forecast = model.predict(future)
-    return forecast
+    except Exception as e:
+        logger.error(f"Ошибка обработки файла: {e}", exc_info=True)
+        raise ValueError(f"Ошибка обработки файла: {str(e)}")
 
 
-def cluster_data(df, n_clusters=3):
-    """Кластеризация данных"""
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    kmeans = KMeans(n_clusters=n_clusters)
-    df['cluster'] = kmeans.fit_predict(df[numeric_cols])
+def _cached_parse(dataset_id, content_type, source) -> pd.DataFrame:
+    if is_excel(content_type):
+        with stage('parse'):
+            return _load_workbook(dataset_id, content_type, source)
+    df = dataset_cache.get(dataset_id)
+    if df is None:
+        with stage('parse'), measure_parse(dataset_id) as stats:
+            df, schema = _parse_decoded(content_type, source)
+        dataset_cache.put(dataset_id, df, meta={'schema': schema, 'parse': stats})
     return df
+
+
+def load_dataset_from_file(path: str, filename: str, dataset_id: str):
+    """
+    То же, что load_dataset, но для файла, уже лежащего на диске (загрузка кусками
+    через /upload): файл читается с диска напрямую, без base64 и копии в памяти.
+    Тип файла определяется по расширению исходного имени.
+    Возвращает (dataset_id, DataFrame).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    content_type = extension.lstrip('.')
+    try:
+        return dataset_id, _cached_parse(dataset_id, content_type, path)
+
+    except Exception as e:
+        logger.error(f"Ошибка обработки файла: {e}", exc_info=True)
+        raise ValueError(f"Ошибка обработки файла: {str(e)}")
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import config
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def new_content_hasher():
+    return hashlib.sha256()
+
+
+def dataset_id_from_hasher(hasher) -> str:
+    """Идентификатор датасета — хэш содержимого загруженного файла."""
+    return hasher.hexdigest()[:16]
+
+
+def dataframe_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _coerce_to_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Копия df, в которой колонки, не переводимые в Arrow, заменены строками (пропуски остаются).
+    У категориальных колонок строками становятся категории (1 и '1' сливаются в одну).
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        column = df[col]
+        is_category = isinstance(column.dtype, pd.CategoricalDtype)
+        if column.dtype != object and not is_category:
+            continue
+        try:
+            pa.array(column, from_pandas=True)
+        except (pa.ArrowException, TypeError, ValueError):
+            logger.info(f"Колонка {col!r} со смешанными типами сохраняется строками")
+            as_str = column.astype(object).where(column.isna(), column.astype(str))
+            df[col] = as_str.astype('category') if is_category else as_str
+    return df
+
+
+class DatasetStore:
+    """
+    Колоночное хранилище датасетов на локальном диске.
+    Файлы пишутся в формате Arrow IPC (Feather v2) без сжатия,
+    поэтому читаются обратно через memory map почти без копирования.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, dataset_id):
+        return os.path.join(self.directory, f"{dataset_id}.arrow")
+
+    def meta_path(self, dataset_id):
+        return os.path.join(self.directory, f"{dataset_id}.json")
+
+    def __contains__(self, dataset_id):
+        return os.path.exists(self.path(dataset_id))
+
+    def write(self, dataset_id, df: pd.DataFrame) -> bool:
+        path = self.path(dataset_id)
+        if os.path.exists(path):
+            return True
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            # Колонки со смешанными типами сохраняем строками: датасет должен попасть на диск,
+            # иначе остальные воркеры gunicorn его не увидят
+            try:
+                table = pa.Table.from_pandas(_coerce_to_arrow(df), preserve_index=False)
+            except (pa.ArrowException, TypeError, ValueError) as e:
+                logger.warning(f"Датасет {dataset_id} не удалось сохранить на диск: {e}")
+                return False
+
+        # Пишем во временный файл и переименовываем, чтобы читатели не увидели половину файла
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+        self._prune()
+        return True
+
+    def read(self, dataset_id, columns=None):
+        path = self.path(dataset_id)
+        if not os.path.exists(path):
+            return None
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        os.utime(path)  # mtime используется как метка последнего доступа
+        return table.to_pandas()
+
+    def write_meta(self, dataset_id, meta: dict):
+        """Сохраняет рядом с данными их описание (схему, статистику)."""
+        tmp_path = f"{self.meta_path(dataset_id)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.meta_path(dataset_id))
+
+    def read_meta(self, dataset_id):
+        try:
+            with open(self.meta_path(dataset_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _prune(self):
+        # Кроме колоночных файлов в каталоге лежат исходные книги Excel (см. utils.excel)
+        # Каталог общий для воркеров gunicorn: файл может исчезнуть, пока его чистит соседний процесс
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(('.arrow', '.xlsx', '.xls')):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            paths = [os.path.join(self.directory, name)]
+            if name.endswith('.arrow'):
+                paths.append(self.meta_path(name[:-len('.arrow')]))
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+class DatasetCache:
+    """
+    Кэш разобранных DataFrame по идентификатору датасета.
+    Горячий уровень — LRU в памяти с лимитом по объёму, холодный — колоночные файлы на диске.
+    Если датасета нет ни там, ни там, по очереди пробуются загрузчики (register_loader),
+    которые умеют восстановить его из исходника — например, листа сохранённой книги Excel.
+    """
+
+    def __init__(self, max_items, max_bytes, store: DatasetStore):
+        self._cache = LRUCache(max_items, max_bytes, dataframe_nbytes)
+        self.store = store
+        self._loaders = []
+
+    def register_loader(self, loader):
+        """loader(dataset_id, columns) -> DataFrame или None."""
+        self._loaders.append(loader)
+
+    def __contains__(self, dataset_id):
+        return dataset_id in self._cache or dataset_id in self.store
+
+    def get(self, dataset_id, columns=None):
+        """
+        columns — какие колонки нужны вызывающему. Если датасета нет в памяти, с диска
+        читаются только они, и такой неполный DataFrame в кэш в памяти не попадает.
+        Из памяти возвращается полный DataFrame.
+        """
+        df = self._cache.get(dataset_id)
+        if df is None:
+            df = self.store.read(dataset_id, columns)
+            if df is not None and columns is None:
+                self._cache.put(dataset_id, df)
+        for loader in self._loaders:
+            if df is not None:
+                break
+            df = loader(dataset_id, columns)
+        return df
+
+    def get_meta(self, dataset_id):
+        return self.store.read_meta(dataset_id)
+
+    def put(self, dataset_id, df: pd.DataFrame, meta=None):
+        # Описание пишется раньше данных: воркер, увидевший файл датасета, найдёт и его описание
+        if meta is not None:
+            self.store.write_meta(dataset_id, meta)
+        self.store.write(dataset_id, df)
+        if not self._cache.put(dataset_id, df):
+            logger.warning(f"Датасет {dataset_id} превышает бюджет кэша в памяти и будет читаться с диска")
+
+    def stats(self):
+        return self._cache.stats()
+
+
+dataset_cache = DatasetCache(
+    config.DATASET_CACHE_MAX_ITEMS,
+    config.DATASET_CACHE_MAX_BYTES,
+    DatasetStore(config.DATASET_STORE_DIR, config.DATASET_STORE_MAX_BYTES),
+)
+
+
+def get_dataframe(dataset_id: str, columns=None) -> pd.DataFrame:
+    """
+    Возвращает DataFrame из кэша (или с диска) или бросает ValueError, если датасет недоступен.
+    columns — необязательный список нужных колонок (см. DatasetCache.get).
+    """
+    if not dataset_id:
+        raise ValueError("Данные не загружены")
+    df = dataset_cache.get(dataset_id, columns)
+    if df is None:
+        raise ValueError("Данные устарели, загрузите файл заново")
+    return df
+
+
+def make_dataset_handle(dataset_id: str, df: pd.DataFrame, profile=None) -> dict:
+    """
+    Компактное описание датасета для dcc.Store: идентификатор, схема и профиль колонок
+    (utils.column_profile) вместо самих строк.
+    """
+    return {
+        'dataset_id': dataset_id,
+        'columns': [str(col) for col in df.columns],
+        'dtypes': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        'n_rows': int(len(df)),
+        'profile': profile,
+    }
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+import config
+from utils.instrumentation import stage
+
+
+def _as_float(values: pd.Series) -> np.ndarray:
+    """Числовое представление колонки для геометрии: даты — в int64, категории — в коды."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(np.float64, na_value=np.nan)
+    codes, _ = pd.factorize(values, sort=True)
+    return codes.astype(np.float64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: выбирает n_out точек, сохраняющих форму линии.
+    x должен быть отсортирован. Возвращает позиции выбранных точек.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Границы корзин для всех точек, кроме первой и последней
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Третья вершина треугольника — среднее следующей корзины
+        next_start, next_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs((x[prev] - avg_x) * (bucket_y - y[prev]) - (x[prev] - bucket_x) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return selected
+
+
+def density_sample_indices(x: np.ndarray, y: np.ndarray, n_out: int, grid: int = 128,
+                           seed: int = 0) -> np.ndarray:
+    """
+    Прореживание облака точек с сохранением плотности: плоскость делится на сетку
+    grid x grid, каждая непустая ячейка получает одну точку — редкие области и выбросы
+    не пропадают, — а остаток бюджета делится пропорционально числу точек в ячейке.
+    Сетка не мельче sqrt(n_out) x sqrt(n_out), поэтому точек всегда не больше n_out.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    grid = max(1, min(grid, int(np.sqrt(n_out))))
+
+    def cell_coord(values):
+        lo, hi = np.nanmin(values), np.nanmax(values)
+        span = hi - lo if hi > lo else 1.0
+        return np.clip(((values - lo) / span * (grid - 1)).astype(np.int64), 0, grid - 1)
+
+    cells = cell_coord(x) * grid + cell_coord(y)
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(n), cells))
+    sorted_cells = cells[order]
+
+    _, starts, counts = np.unique(sorted_cells, return_index=True, return_counts=True)
+    n_cells = len(counts)
+    quota = 1 + np.floor((counts - 1) * ((n_out - n_cells) / (n - n_cells))).astype(np.int64)
+    rank = np.arange(n) - np.repeat(starts, counts)
+    keep = rank < np.repeat(quota, counts)
+    return np.sort(order[keep])
+
+
+def parse_x_range(relayout_data):
+    """Достаёт диапазон оси X из relayoutData графика. None — масштаб сброшен или не менялся."""
+    if not relayout_data:
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
+
+
+def is_zoom_event(relayout_data) -> bool:
+    """Относится ли relayoutData к масштабу оси X (приближение или сброс)."""
+    return bool(relayout_data) and any(key.startswith('xaxis.') for key in relayout_data)
+
+
+def _filter_x_range(df: pd.DataFrame, x: str, x_range) -> pd.DataFrame:
+    if x_range is None:
+        return df
+    column = df[x]
+    if pd.api.types.is_datetime64_any_dtype(column):
+        lo, hi = pd.to_datetime(x_range[0]), pd.to_datetime(x_range[1])
+    elif pd.api.types.is_numeric_dtype(column):
+        lo, hi = float(x_range[0]), float(x_range[1])
+    else:
+        # Для категориальной оси диапазон задан в позициях категорий
+        return df
+    return df[(column >= lo) & (column <= hi)]
+
+
+@stage('aggregate')
+def decimate(df: pd.DataFrame, x: str, y: str, method: str, x_range=None, budget=None) -> pd.DataFrame:
+    """
+    Уменьшает число точек до бюджета: method='lttb' для линий, 'density' для облаков точек.
+    При приближении (x_range) прореживается только видимый диапазон — детализация растёт.
+    """
+    budget = budget or config.POINT_BUDGET
+    df = _filter_x_range(df, x, x_range)
+    if len(df) <= budget:
+        return df
+
+    df = df.dropna(subset=[x, y])
+    if method == 'lttb':
+        x_values = _as_float(df[x])
+        if not np.all(x_values[1:] >= x_values[:-1]):
+            order = np.argsort(x_values, kind='stable')
+            df = df.iloc[order]
+            x_values = x_values[order]
+        indices = lttb_indices(x_values, _as_float(df[y]), budget)
+    else:
+        indices = density_sample_indices(_as_float(df[x]), _as_float(df[y]), budget)
+    return df.iloc[indices]
+
+
+def use_webgl(n_points: int) -> bool:
+    return n_points > config.WEBGL_THRESHOLD
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+import shutil
+
+import pandas as pd
+
+import config
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+
+def is_excel(content_type: str) -> bool:
+    """MIME-тип data URL (или расширение) соответствует книге Excel."""
+    return any(marker in content_type for marker in ('xls', 'spreadsheetml', 'ms-excel'))
+
+
+def excel_extension(content_type: str) -> str:
+    return '.xls' if 'ms-excel' in content_type or content_type.endswith('xls') else '.xlsx'
+
+
+def excel_engine():
+    """
+    Движок pandas.read_excel. calamine (Rust, пакет python-calamine) на больших книгах
+    в разы быстрее openpyxl и читает и .xlsx, и .xls; используется, если установлен.
+    None — движок по умолчанию pandas.
+    """
+    if config.EXCEL_ENGINE != 'auto':
+        return config.EXCEL_ENGINE
+    return 'calamine' if importlib.util.find_spec('python_calamine') else None
+
+
+def sheet_dataset_id(workbook_id: str, index: int) -> str:
+    """Идентификатор датасета листа. Первый лист совпадает с идентификатором книги."""
+    return workbook_id if index == 0 else f"{workbook_id}-s{index}"
+
+
+def split_sheet_dataset_id(dataset_id: str):
+    """Обратное к sheet_dataset_id: (идентификатор книги, номер листа)."""
+    workbook_id, _, index = dataset_id.partition('-s')
+    return workbook_id, int(index) if index.isdigit() else 0
+
+
+def workbook_path(workbook_id: str):
+    """Путь к сохранённой книге в каталоге датасетов или None, если книги там нет."""
+    for extension in EXCEL_EXTENSIONS:
+        path = os.path.join(config.DATASET_STORE_DIR, f"{workbook_id}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def save_workbook(source, workbook_id: str, extension: str) -> str:
+    """
+    Сохраняет книгу рядом с колоночными файлами: листы разбираются из неё
+    в отдельных процессах, а при вытеснении датасета нужные колонки перечитываются.
+    """
+    path = os.path.join(config.DATASET_STORE_DIR, f"{workbook_id}{extension}")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if isinstance(source, str):
+            shutil.copyfile(source, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(source.getbuffer())
+        os.replace(tmp_path, path)
+    return path
+
+
+def sheet_names(path) -> list:
+    with pd.ExcelFile(path, engine=excel_engine()) as workbook:
+        return [str(name) for name in workbook.sheet_names]
+
+
+def read_sheet(path, sheet=0, usecols=None) -> pd.DataFrame:
+    """Читает лист книги; usecols — только перечисленные колонки (по именам из заголовка)."""
+    return pd.read_excel(path, sheet_name=sheet, usecols=usecols, engine=excel_engine())
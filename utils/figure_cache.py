@@ -0,0 +1,42 @@
+import json
+import logging
+
+import config
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class FigureCache:
+    """
+    Кэш готовых фигур по (датасет, тип графика, оси, видимый диапазон, перекрёстный фильтр).
+    Хранит сериализованный JSON фигуры, объём ограничен по длине JSON.
+    """
+
+    def __init__(self, max_items, max_bytes):
+        self._cache = LRUCache(max_items, max_bytes, len)
+
+    @staticmethod
+    def make_key(dataset_id, graph_type, x_axis, y_axis, z_axis, x_range=None, filter_key=''):
+        return (dataset_id, graph_type, x_axis, y_axis, z_axis,
+                tuple(map(str, x_range)) if x_range else None, filter_key)
+
+    def get(self, key):
+        """Возвращает фигуру в виде dict (Dash принимает его как figure) или None."""
+        figure_json = self._cache.get(key)
+        logger.debug(f"Кэш фигур: {'попадание' if figure_json is not None else 'промах'} {key}")
+        return json.loads(figure_json) if figure_json is not None else None
+
+    def put(self, key, fig):
+        figure_json = fig.to_json()
+        self._cache.put(key, figure_json)
+        return figure_json
+
+    def stats(self):
+        stats = self._cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+figure_cache = FigureCache(config.FIGURE_CACHE_MAX_ITEMS, config.FIGURE_CACHE_MAX_BYTES)
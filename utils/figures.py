@@ -0,0 +1,198 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils.aggregation import bar_figure, box_figure, heatmap_figure, histogram_figure, pie_values
+from utils.column_profile import columns_of_kind
+from utils.decimation import decimate, use_webgl
+
+# Типы графиков, которые при приближении перестраиваются с большей детализацией
+ZOOMABLE_GRAPH_TYPES = {'line', 'scatter', 'bubble', 'combo'}
+
+
+class FigureError(ValueError):
+    """Для выбранного типа графика не хватает данных — сообщение показывается пользователю."""
+
+
+def _points_note(shown: int, total: int) -> str:
+    return f' ({shown:,} из {total:,} точек)'.replace(',', ' ') if shown < total else ''
+
+
+def _bubble_size_column(numeric_cols, z_axis):
+    """Колонка размера пузырьков: выбранная Z, если она числовая, иначе третья числовая колонка."""
+    return z_axis if z_axis in numeric_cols else (numeric_cols[2] if len(numeric_cols) > 2 else None)
+
+
+def figure_columns(graph_type, x_axis, y_axis, z_axis, profile=None):
+    """
+    Колонки, по которым строится график, — только они читаются с диска (или из книги Excel).
+    None — нужен весь датасет.
+    """
+    if graph_type == 'gantt':
+        return ['Task', 'Start', 'Finish']
+    if graph_type == 'candlestick':
+        return [x_axis, 'open', 'high', 'low', 'close'] if x_axis else ['open', 'high', 'low', 'close']
+    if graph_type == 'choropleth' and not y_axis:
+        return None
+    columns = [x_axis, y_axis]
+    if graph_type == 'bubble':
+        if not profile:
+            return None
+        columns.append(_bubble_size_column(columns_of_kind(profile, 'numeric'), z_axis))
+    return [col for col in dict.fromkeys(columns) if col]
+
+
+def build_figure(df: pd.DataFrame, graph_type, x_axis, y_axis, z_axis, x_range=None, profile=None):
+    """
+    Строит фигуру Plotly выбранного типа.
+    x_range — видимый диапазон оси X при приближении: линии и облака точек
+    прореживаются заново только в этом диапазоне.
+    profile — профиль колонок датасета (utils.column_profile): статистика берётся
+    из него, а не пересчитывается по данным.
+    """
+    if graph_type == 'line':
+        plot_df = decimate(df, x_axis, y_axis, 'lttb', x_range)
+        fig = px.line(plot_df, x=x_axis, y=y_axis,
+                      render_mode='webgl' if use_webgl(len(plot_df)) else 'svg',
+                      title='Линейный график' + _points_note(len(plot_df), len(df)))
+    elif graph_type == 'bar':
+        fig = bar_figure(df, x_axis, y_axis, 'Столбчатая диаграмма')
+    elif graph_type == 'pie':
+        if not x_axis:
+            raise FigureError("Для круговой диаграммы нужно выбрать категории (ось X)")
+
+        # Если y_axis не указан, считаем количество каждой категории
+        if not y_axis:
+            pie_data = df[x_axis].value_counts().loc[lambda counts: counts > 0].reset_index()
+            pie_data.columns = ['category', 'count']
+            fig = px.pie(pie_data,
+                         names='category',
+                         values='count',
+                         title=f'Распределение по {x_axis} (количество)')
+        else:
+            # Если y_axis указан, используем его значения (любого типа)
+            pie_df = df[[x_axis, y_axis]].dropna()
+
+            if len(pie_df) == 0:
+                raise FigureError("Нет данных для построения диаграммы")
+
+            # Для нечисловых значений преобразуем в строки и считаем количество
+            if not pd.api.types.is_numeric_dtype(pie_df[y_axis]):
+                pie_data = pie_df.groupby([x_axis, y_axis], observed=True).size().reset_index(name='count')
+                fig = px.pie(pie_data,
+                             names=y_axis,
+                             values='count',
+                             title=f'Распределение {y_axis} по {x_axis}',
+                             color=x_axis)
+            else:
+                # Для числовых значений суммируем по категориям
+                fig = px.pie(pie_values(pie_df, x_axis, y_axis),
+                             names=x_axis,
+                             values=y_axis,
+                             title=f'Распределение {y_axis} по {x_axis}')
+
+        # Улучшаем отображение
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        fig.update_layout(uniformtext_minsize=10, uniformtext_mode='hide',
+                          legend=dict(orientation="h", yanchor="bottom", y=-0.2))
+    elif graph_type == 'scatter':
+        plot_df = decimate(df, x_axis, y_axis, 'density', x_range)
+        fig = px.scatter(plot_df, x=x_axis, y=y_axis,
+                         render_mode='webgl' if use_webgl(len(plot_df)) else 'svg',
+                         title='Точечная диаграмма' + _points_note(len(plot_df), len(df)))
+    elif graph_type == 'histogram':
+        fig = histogram_figure(df, x_axis, 'Гистограмма')
+    elif graph_type == 'box':
+        fig = box_figure(df, x_axis, y_axis, 'Ящик с усами')
+    elif graph_type == 'heatmap':
+        if not x_axis or not y_axis:
+            raise FigureError("Для тепловой карты нужны X и Y оси")
+        fig = heatmap_figure(df, x_axis, y_axis, 'Тепловая карта')
+    elif graph_type == 'bubble':
+        if not x_axis or not y_axis:
+            raise FigureError("Для пузырьковой диаграммы нужны X и Y оси")
+
+        # Проверяем, есть ли числовая колонка для размера пузырьков
+        if profile:
+            numeric_cols = columns_of_kind(profile, 'numeric')
+        else:
+            numeric_cols = df.select_dtypes(include=['number']).columns
+        size_col = _bubble_size_column(numeric_cols, z_axis)
+
+        plot_df = decimate(df, x_axis, y_axis, 'density', x_range)
+        render_mode = 'webgl' if use_webgl(len(plot_df)) else 'svg'
+        note = _points_note(len(plot_df), len(df))
+
+        # Если нет подходящей колонки для размера, используем постоянный размер
+        if size_col is None:
+            fig = px.scatter(plot_df, x=x_axis, y=y_axis, render_mode=render_mode,
+                             title='Пузырьковая диаграмма (постоянный размер)' + note)
+        else:
+            # Нормализуем размер по всему датасету, а не по прореженной выборке
+            if profile:
+                size_min, size_max = profile[size_col]['min'], profile[size_col]['max']
+            else:
+                size_min, size_max = df[size_col].min(), df[size_col].max()
+            sizes = (plot_df[size_col] - size_min) / (size_max - size_min) * 100 + 10
+            fig = px.scatter(plot_df, x=x_axis, y=y_axis, size=sizes.to_numpy(), render_mode=render_mode,
+                             title=f'Пузырьковая диаграмма (размер: {size_col})' + note)
+
+        # Настраиваем внешний вид
+        fig.update_traces(marker=dict(opacity=0.7, line=dict(width=0.5, color='DarkSlateGrey')))
+    elif graph_type == 'sankey':
+        if not x_axis or not y_axis:
+            raise FigureError("Для диаграммы Санкея нужны источник и цель")
+
+        # Группируем данные для подсчета потоков
+        df_sankey = df.groupby([x_axis, y_axis], observed=True).size().reset_index(name='value')
+
+        # Создаем словарь узлов
+        unique_nodes = pd.unique(df_sankey[[x_axis, y_axis]].to_numpy(dtype=object).ravel('K'))
+        node_dict = {node: i for i, node in enumerate(unique_nodes)}
+
+        fig = go.Figure(go.Sankey(
+            node=dict(
+                label=list(node_dict.keys()),
+                pad=15,
+                thickness=20,
+                line=dict(color="black", width=0.5)
+            ),
+            link=dict(
+                source=df_sankey[x_axis].astype(object).map(node_dict),
+                target=df_sankey[y_axis].astype(object).map(node_dict),
+                value=df_sankey['value'].tolist(),
+                color="rgba(0,128,0,0.3)"
+            )
+        ))
+        fig.update_layout(title_text='Диаграмма Санкея', font_size=10)
+    elif graph_type == 'choropleth':
+        if not x_axis:
+            raise FigureError("Для карты нужна колонка с географическими данными")
+        fig = px.choropleth(df, locations=x_axis, locationmode='country names',
+                            color=y_axis if y_axis else df.columns[1],
+                            title='Географическая карта')
+    elif graph_type == 'gantt':
+        if not all(col in df.columns for col in ['Task', 'Start', 'Finish']):
+            raise FigureError("Для графика Ганта нужны колонки: Task, Start, Finish")
+        fig = px.timeline(df, x_start="Start", x_end="Finish", y="Task", title='График Ганта')
+    elif graph_type == 'candlestick':
+        if not all(col in df.columns for col in ['open', 'high', 'low', 'close']):
+            raise FigureError("Для биржевого графика нужны колонки: open, high, low, close")
+        fig = go.Figure(go.Candlestick(
+            x=df[x_axis] if x_axis else df.index,
+            open=df['open'],
+            high=df['high'],
+            low=df['low'],
+            close=df['close']
+        ))
+    elif graph_type == 'combo':
+        plot_df = decimate(df, x_axis, y_axis, 'lttb', x_range)
+        scatter = go.Scattergl if use_webgl(len(plot_df)) else go.Scatter
+        fig = go.Figure()
+        fig.add_trace(scatter(x=plot_df[x_axis], y=plot_df[y_axis], name='Линия'))
+        fig.add_trace(go.Bar(x=plot_df[x_axis], y=plot_df[y_axis], name='Столбцы'))
+        fig.update_layout(title='Комбинированная диаграмма' + _points_note(len(plot_df), len(df)))
+    else:
+        fig = px.scatter(title='Выберите тип графика')
+
+    return fig
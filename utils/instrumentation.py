@@ -0,0 +1,227 @@
+"""
+Профилирование callback'ов: время стадий, размеры запроса и ответа, число строк
+и пик памяти на каждый вызов, экспорт в Prometheus (/metrics).
+
+    @app.callback(...)
+    @instrument_callback
+    def update_graph(...):
+        with stage('figure'):
+            ...
+
+Стадии могут вкладываться (aggregate внутри figure) — время каждой считается целиком.
+С заголовком PROFILE_HEADER (если PROFILE_ENABLED) вызов дополнительно профилируется,
+профиль сохраняется в PROFILE_DIR: pyinstrument (HTML), если установлен, иначе cProfile.
+"""
+import cProfile
+import functools
+import importlib.util
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import psutil
+from dash.exceptions import PreventUpdate
+from flask import Response, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+import config
+from utils.dataset_cache import dataset_cache
+from utils.figure_cache import figure_cache
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('callback_record', default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+BYTES_BUCKETS = tuple(4 ** i * 1024 for i in range(12))  # 1 КБ ... 4 ГБ
+ROWS_BUCKETS = tuple(10 ** i for i in range(9))
+
+CALLBACK_SECONDS = Histogram('visualcsv_callback_seconds', "Время выполнения callback'а",
+                             ['callback'], buckets=SECONDS_BUCKETS)
+STAGE_SECONDS = Histogram('visualcsv_callback_stage_seconds', "Время стадии callback'а",
+                          ['callback', 'stage'], buckets=SECONDS_BUCKETS)
+CALLBACK_ERRORS = Counter('visualcsv_callback_errors', "Исключения в callback'ах", ['callback'])
+CALLBACK_ROWS = Histogram('visualcsv_callback_rows', "Строк данных, обработанных callback'ом",
+                          ['callback'], buckets=ROWS_BUCKETS)
+PEAK_MEMORY = Histogram('visualcsv_callback_peak_memory_bytes', "Пик прироста RSS за вызов callback'а",
+                        ['callback'], buckets=BYTES_BUCKETS)
+REQUEST_BYTES = Histogram('visualcsv_callback_request_bytes', "Размер запроса callback'а",
+                          ['callback'], buckets=BYTES_BUCKETS)
+RESPONSE_BYTES = Histogram('visualcsv_callback_response_bytes', "Размер ответа callback'а",
+                           ['callback'], buckets=BYTES_BUCKETS)
+
+
+@contextmanager
+def peak_rss(interval=None):
+    """
+    Пиковый прирост RSS процесса за время блока: stats['peak_bytes'] заполняется на выходе.
+    RSS опрашивается фоновым потоком — в отличие от tracemalloc это не замедляет код
+    с миллионами Python-объектов. При параллельных запросах значение приблизительное.
+    """
+    stats = {}
+    process = psutil.Process()
+    baseline = peak = process.memory_info().rss
+    stop = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not stop.wait(interval or config.PARSE_MEMORY_SAMPLE_SECONDS):
+            peak = max(peak, process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield stats
+    finally:
+        stop.set()
+        sampler.join()
+        stats['peak_bytes'] = max(peak, process.memory_info().rss) - baseline
+
+
+@contextmanager
+def stage(name: str):
+    """Замеряет стадию текущего callback'а. Вне callback'а ничего не делает."""
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        record['stages'][name] = record['stages'].get(name, 0.0) + seconds
+        STAGE_SECONDS.labels(record['callback'], name).observe(seconds)
+
+
+def record_rows(n_rows: int):
+    """Сколько строк данных обработал текущий callback."""
+    record = _current.get()
+    if record is not None:
+        record['rows'] = int(n_rows)
+
+
+def record_error():
+    """Ошибка, которую callback перехватил сам и показал пользователю сообщением."""
+    record = _current.get()
+    if record is not None:
+        CALLBACK_ERRORS.labels(record['callback']).inc()
+
+
+def _profile_requested() -> bool:
+    return (config.PROFILE_ENABLED and has_request_context()
+            and request.headers.get(config.PROFILE_HEADER) is not None)
+
+
+def _run_profiled(name, func, args, kwargs):
+    """Выполняет func под профилировщиком и сохраняет профиль в PROFILE_DIR."""
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(config.PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    if importlib.util.find_spec('pyinstrument'):
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.stop()
+            with open(f"{path}.html", 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            logger.info(f"Профиль {name} сохранён в {path}.html")
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(f"{path}.prof")
+        logger.info(f"Профиль {name} сохранён в {path}.prof")
+
+
+def instrument_callback(func):
+    """
+    Декоратор callback'а: время, стадии, строки, пик памяти и размер запроса попадают
+    в метрики Prometheus; размер ответа досчитывается в after_request (register_metrics).
+    Итог вызова пишется в лог на уровне DEBUG.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        record = {'callback': name, 'stages': {}, 'rows': None}
+        token = _current.set(record)
+        if has_request_context():
+            g.visualcsv_callback = name
+            if request.content_length:
+                REQUEST_BYTES.labels(name).observe(request.content_length)
+
+        memory = {}
+        started = time.perf_counter()
+        try:
+            with peak_rss() as memory:
+                if _profile_requested():
+                    return _run_profiled(name, func, args, kwargs)
+                return func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            CALLBACK_ERRORS.labels(name).inc()
+            raise
+        finally:
+            _current.reset(token)
+            seconds = time.perf_counter() - started
+            CALLBACK_SECONDS.labels(name).observe(seconds)
+            PEAK_MEMORY.labels(name).observe(max(memory.get('peak_bytes', 0), 0))
+            if record['rows'] is not None:
+                CALLBACK_ROWS.labels(name).observe(record['rows'])
+            stages = ', '.join(f"{stage_name} {value:.3f} с" for stage_name, value in record['stages'].items())
+            logger.debug(f"{name}: {seconds:.3f} с, строк {record['rows']}, "
+                         f"пик памяти +{memory.get('peak_bytes', 0) / 1024 ** 2:.1f} МБ; {stages}")
+
+    return wrapper
+
+
+class CacheCollector:
+    """Состояние кэшей датасетов и фигур процесса, который отвечает на /metrics."""
+
+    def collect(self):
+        for cache_name, stats in (('dataset', dataset_cache.stats()), ('figure', figure_cache.stats())):
+            for key, value in stats.items():
+                metric = GaugeMetricFamily(f'visualcsv_{cache_name}_cache_{key}',
+                                           f"Кэш {cache_name}: {key}")
+                metric.add_metric([], value)
+                yield metric
+
+
+def _metrics_registry():
+    """
+    Под gunicorn и в фоновых задачах метрики пишет несколько процессов: если задан
+    PROMETHEUS_MULTIPROC_DIR, /metrics собирает их из файлов всех процессов.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def register_metrics(app):
+    """Маршрут /metrics и учёт размера ответов callback'ов."""
+    server = app.server
+    registry = _metrics_registry()
+    registry.register(CacheCollector())
+
+    @server.after_request
+    def observe_response_size(response):
+        name = g.pop('visualcsv_callback', None)
+        if name is not None and not response.direct_passthrough:
+            RESPONSE_BYTES.labels(name).observe(response.calculate_content_length() or 0)
+        return response
+
+    @server.route(f"{app.config.routes_pathname_prefix}metrics")
+    def metrics():
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
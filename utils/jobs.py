@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+
+import diskcache
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import DiskcacheManager
+
+import config
+from utils.analytics import load_backend
+from utils.column_profile import columns_of_kind
+from utils.crossfilter import active_filters, apply_crossfilter, condition_columns, filters_key
+from utils.dataset_cache import get_dataframe
+from utils.decimation import decimate, use_webgl
+from utils.instrumentation import record_rows, stage
+
+logger = logging.getLogger(__name__)
+
+# Очередь фоновых задач Dash: каждая задача выполняется в отдельном процессе,
+# состояние и прогресс хранятся в diskcache и видны всем процессам сервера
+os.makedirs(config.JOB_CACHE_DIR, exist_ok=True)
+background_manager = DiskcacheManager(diskcache.Cache(os.path.join(config.JOB_CACHE_DIR, 'queue')))
+
+# Готовые результаты анализов: (датасет, тип анализа, параметры) -> JSON фигуры
+result_cache = diskcache.Cache(os.path.join(config.JOB_CACHE_DIR, 'results'),
+                               size_limit=config.JOB_RESULT_CACHE_BYTES)
+
+
+def analysis_key(dataset_id, analysis_type, params):
+    return json.dumps([dataset_id, analysis_type, params], sort_keys=True, default=str)
+
+
+def _model_key(params):
+    """Ключ кэша моделей прогноза: модели, обученные на отфильтрованных строках, хранятся отдельно."""
+    if params.get('filters'):
+        return f"{params['dataset_id']}:{filters_key(params['filters'])}"
+    return params['dataset_id']
+
+
+def _anomaly_figure(df, params):
+    columns = params['columns']
+    labels = load_backend('anomaly').detect_anomalies(df, columns, method=params['method'])
+
+    # На графике первая колонка по номеру строки; нормальные точки и аномалии прореживаются
+    # отдельно, чтобы редкие аномалии не потерялись среди миллионов обычных точек
+    column = columns[0]
+    plot_df = pd.DataFrame({'строка': np.arange(len(df)), column: df[column].to_numpy()})
+    is_anomaly = labels.to_numpy() == 1
+    normal = decimate(plot_df[~is_anomaly], 'строка', column, 'density')
+    anomalies = decimate(plot_df[is_anomaly], 'строка', column, 'density')
+
+    scatter = go.Scattergl if use_webgl(len(normal) + len(anomalies)) else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(scatter(x=normal['строка'], y=normal[column], mode='markers', name='Норма',
+                          marker=dict(color='#636efa', size=4)))
+    fig.add_trace(scatter(x=anomalies['строка'], y=anomalies[column], mode='markers', name='Аномалия',
+                          marker=dict(color='#ef553b', size=6)))
+    fig.update_layout(title=f'Анализ аномалий: {", ".join(columns)} '
+                            f'(найдено {int(is_anomaly.sum())} из {len(df)})',
+                      xaxis_title='строка', yaxis_title=column)
+    return fig
+
+
+def _forecast_figure(df, params):
+    date_col, value_col, group_col = params['date_column'], params['column'], params['group_column']
+    backend = load_backend('forecast')
+    # История на графике — те же суммы по датам, на которых обучалась модель, прореженные до бюджета
+    history = backend.sum_by_date(df, date_col, value_col, group_col)
+    forecast = backend.forecast_time_series(df, date_col, value_col, periods=params['periods'], group_col=group_col,
+                                            model_key=_model_key(params), history=history)
+
+    fig = go.Figure()
+    if group_col:
+        # По группе: прогноз сплошной линией, история — точками того же цвета
+        plotted = list(forecast.groupby(group_col, sort=False, observed=True))[:config.FORECAST_PLOT_GROUPS]
+        histories = dict(list(history.groupby(group_col, sort=False, observed=True)))
+        budget = max(config.POINT_BUDGET // max(len(plotted), 1), 3)
+        points = {group: decimate(histories[group], 'ds', 'y', 'lttb', budget=budget) for group, _ in plotted}
+        scatter = go.Scattergl if use_webgl(sum(map(len, points.values()))) else go.Scatter
+        for i, (group, part) in enumerate(plotted):
+            color = px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)]
+            fig.add_trace(scatter(x=points[group]['ds'], y=points[group]['y'], mode='markers',
+                                  marker=dict(color=color, size=4), legendgroup=str(group), showlegend=False))
+            fig.add_trace(go.Scatter(x=part['ds'], y=part['yhat'], line=dict(color=color),
+                                     legendgroup=str(group), name=str(group)))
+    else:
+        points = decimate(history, 'ds', 'y', 'lttb')
+        scatter = go.Scattergl if use_webgl(len(points)) else go.Scatter
+        fig.add_trace(scatter(x=points['ds'], y=points['y'], mode='markers', name='Факт'))
+        fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_upper'], line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_lower'], line=dict(width=0),
+                                 fill='tonexty', fillcolor='rgba(99,110,250,0.2)', name='Интервал'))
+        fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], name='Прогноз'))
+    by_group = f' по {group_col}' if group_col else ''
+    fig.update_layout(title=f'Прогноз {value_col}{by_group} на {params["periods"]} периодов')
+    return fig
+
+
+def _cluster_figure(df, params):
+    columns = params['columns']
+    # Модель всегда обучается на всём датасете: смена фильтра лишь переназначает кластеры строкам
+    full_df = get_dataframe(params['dataset_id'], columns) if params.get('filters') else df
+    labels = load_backend('cluster').cluster_data(df, columns, n_clusters=params['n_clusters'],
+                                                  model_key=params['dataset_id'], fit_df=full_df)
+    n_clusters = int(labels.max()) + 1
+
+    x, y = (columns[0], columns[1]) if len(columns) > 1 else ('строка', columns[0])
+    plot_df = pd.DataFrame({'строка': np.arange(len(df)), 'кластер': labels.astype(str).to_numpy()})
+    for col in {x, y} - {'строка'}:
+        plot_df[col] = df[col].to_numpy()
+    plot_df = decimate(plot_df, x, y, 'density')
+
+    return px.scatter(plot_df, x=x, y=y, color='кластер',
+                      render_mode='webgl' if use_webgl(len(plot_df)) else 'svg',
+                      title=f'Кластеризация (кластеров: {n_clusters})')
+
+
+ANALYSES = {
+    'anomaly': _anomaly_figure,
+    'forecast': _forecast_figure,
+    'cluster': _cluster_figure,
+}
+
+
+def analysis_params(analysis_type, stored_data, columns, date_column, group_column=None, crossfilter=None):
+    """
+    Параметры анализа по выбору пользователя; они же входят в ключ кэша результатов.
+    С активным перекрёстным фильтром анализ идёт только по отобранным строкам.
+    """
+    params = _analysis_params(analysis_type, stored_data, columns, date_column, group_column)
+    params['filters'] = active_filters(crossfilter, stored_data['dataset_id'])
+    return params
+
+
+def _analysis_params(analysis_type, stored_data, columns, date_column, group_column):
+    numeric_cols = columns_of_kind(stored_data['profile'], 'numeric')
+    if isinstance(columns, str):
+        columns = [columns]
+    if analysis_type in ('anomaly', 'forecast') and not columns:
+        if not numeric_cols:
+            raise ValueError("Нет числовых колонок для анализа")
+        columns = numeric_cols[:1]
+
+    if analysis_type == 'anomaly':
+        return {'columns': columns, 'method': 'auto'}
+    if analysis_type == 'forecast':
+        if not date_column:
+            raise ValueError("Для прогноза выберите колонку с датами на оси X")
+        return {'column': columns[0], 'date_column': date_column, 'group_column': group_column,
+                'periods': config.FORECAST_PERIODS, 'dataset_id': stored_data['dataset_id']}
+    if analysis_type == 'cluster':
+        if not numeric_cols:
+            raise ValueError("Нет числовых колонок для анализа")
+        # n_clusters=None — число кластеров подбирается автоматически
+        return {'columns': numeric_cols, 'n_clusters': None, 'dataset_id': stored_data['dataset_id']}
+    raise ValueError("Выберите тип AI-анализа")
+
+
+def analysis_columns(params) -> list:
+    """Колонки датасета, которые нужны анализу (с колонками фильтра): остальные с диска не читаются."""
+    columns = list(params.get('columns') or [])
+    names = [params.get(key) for key in ('column', 'date_column', 'group_column')]
+    names.extend(condition_columns(params.get('filters')))
+    for name in names:
+        if name and name not in columns:
+            columns.append(name)
+    return columns
+
+
+def run_analysis(set_progress, analysis_type, stored_data, columns=None, date_column=None, group_column=None,
+                 crossfilter=None):
+    """
+    Выполняет AI-анализ в фоновом процессе и возвращает фигуру в виде dict.
+    Результат кэшируется по датасету и параметрам — повторный запуск мгновенный.
+    set_progress получает (выполнено, всего) шагов.
+    """
+    dataset_id = stored_data['dataset_id']
+    params = analysis_params(analysis_type, stored_data, columns, date_column, group_column, crossfilter)
+    key = analysis_key(dataset_id, analysis_type, params)
+
+    cached = result_cache.get(key)
+    if cached is not None:
+        logger.info(f"Результат анализа {analysis_type} для {dataset_id} взят из кэша")
+        return json.loads(cached)
+
+    set_progress((1, 4))
+    with stage('load'):
+        df = apply_crossfilter(dataset_id, get_dataframe(dataset_id, analysis_columns(params)), params['filters'])
+    record_rows(len(df))
+
+    set_progress((2, 4))
+    with stage('analysis'):
+        fig = ANALYSES[analysis_type](df, params)
+
+    set_progress((3, 4))
+    with stage('serialize'):
+        figure_json = fig.to_json()
+    result_cache.set(key, figure_json)
+
+    set_progress((4, 4))
+    return json.loads(figure_json)
@@ -0,0 +1,91 @@
+import logging
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.column_profile import profile_columns
+from utils.dataset_cache import dataframe_nbytes
+
+logger = logging.getLogger(__name__)
+
+# Колонки, которые по имени ожидаются датами (в том числе Start/Finish для графика Ганта)
+DATE_NAME_HINTS = ('date', 'time', 'start', 'finish', 'дата', 'время')
+# Время суток без даты ('10:30', '7:05:12 PM'): pandas дописал бы к нему сегодняшнюю дату
+TIME_ONLY_PATTERN = r'\s*\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?\s*([AaPp]\.?[Mm]\.?)?\s*'
+
+
+def downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Уменьшает разрядность числовых колонок без потери значений."""
+    for col in df.columns:
+        column = df[col]
+        if pd.api.types.is_integer_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            df[col] = pd.to_numeric(column, downcast='integer')
+        elif pd.api.types.is_float_dtype(column) and column.dtype != np.float32:
+            as_float32 = column.astype(np.float32)
+            # float32 берём только если все значения представимы точно
+            if np.array_equal(as_float32.to_numpy(np.float64), column.to_numpy(np.float64), equal_nan=True):
+                df[col] = as_float32
+    return df
+
+
+def _parse_dates(column: pd.Series):
+    """Пытается разобрать строковую колонку как даты. None — колонка не похожа на даты."""
+    sample = column.dropna().head(config.SCHEMA_SAMPLE_ROWS)
+    if sample.empty or sample.astype(str).str.fullmatch(TIME_ONLY_PATTERN).any():
+        return None
+    with warnings.catch_warnings():
+        # pandas предупреждает, когда формат дат не удалось вывести однозначно
+        warnings.simplefilter('ignore', UserWarning)
+        if pd.to_datetime(sample, errors='coerce').isna().any():
+            return None
+        parsed = pd.to_datetime(column, errors='coerce')
+    # Принимаем, только если разобрались все непустые значения
+    return parsed if parsed.notna().sum() == column.notna().sum() else None
+
+
+def _should_categorize(column: pd.Series) -> bool:
+    n_rows = len(column)
+    if n_rows == 0:
+        return False
+    # Дешёвая проверка по выборке, прежде чем считать уникальные значения всей колонки
+    sample = column.head(config.SCHEMA_SAMPLE_ROWS)
+    if sample.nunique() > config.CATEGORY_MAX_RATIO * len(sample):
+        return False
+    return column.nunique() <= config.CATEGORY_MAX_RATIO * n_rows
+
+
+def optimize_schema(df: pd.DataFrame):
+    """
+    Оптимизирует типы колонок при загрузке:
+    - числа — минимальная разрядность без потерь;
+    - строки, похожие на даты (в первую очередь по имени колонки), — datetime, один раз при загрузке;
+    - строки с небольшим числом уникальных значений — category (в Arrow — dictionary).
+    Возвращает (df, схема) — схема с типами колонок, объёмом памяти до и после
+    и профилем колонок (utils.column_profile) по итоговым типам.
+    """
+    memory_before = dataframe_nbytes(df)
+    df = downcast_numeric(df)
+
+    for col in df.columns:
+        column = df[col]
+        if column.dtype != object:
+            continue
+
+        looks_like_date = any(hint in col.lower() for hint in DATE_NAME_HINTS)
+        parsed = _parse_dates(column) if looks_like_date or config.SCHEMA_DETECT_ALL_DATES else None
+        if parsed is not None:
+            df[col] = parsed
+        elif _should_categorize(column):
+            df[col] = column.astype('category')
+
+    memory_after = dataframe_nbytes(df)
+    schema = {
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+        'memory_before': memory_before,
+        'memory_after': memory_after,
+        'profile': profile_columns(df),
+    }
+    logger.info(f"Оптимизация типов: {memory_before / 1024 ** 2:.1f} МБ -> {memory_after / 1024 ** 2:.1f} МБ")
+    return df, schema
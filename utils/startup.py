@@ -0,0 +1,70 @@
+"""
+Проверка времени старта приложения.
+
+Запускает `import app` в отдельном интерпретаторе с `-X importtime`, печатает
+время импорта по модулям верхнего уровня и завершается с ошибкой, если старт
+дольше бюджета или при старте импортируются тяжёлые аналитические библиотеки.
+
+    python -m utils.startup [--budget 5] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+import config
+from utils.analytics import HEAVY_MODULES
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import_times(target='app'):
+    """Возвращает {модуль верхнего уровня: секунды}, суммируя собственное время импорта подмодулей."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {target}:\n{result.stderr[-2000:]}")
+
+    times = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        times[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return dict(times)
+
+
+def check_startup_budget(budget, top=15):
+    times = measure_import_times()
+    total = sum(times.values())
+
+    print(f"{'модуль':<30}{'время, с':>10}")
+    for name, seconds in sorted(times.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{name:<30}{seconds:>10.3f}")
+    print(f"{'итого':<30}{total:>10.3f}  (бюджет {budget:.1f} с)")
+
+    ok = True
+    heavy = [name for name in HEAVY_MODULES if name in times]
+    if heavy:
+        print(f"Ошибка: при старте импортированы тяжёлые модули: {', '.join(heavy)}")
+        ok = False
+    if total > budget:
+        print("Ошибка: время старта превышает бюджет")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта приложения по модулям")
+    parser.add_argument('--budget', type=float, default=config.STARTUP_IMPORT_BUDGET,
+                        help="допустимое суммарное время импорта, с")
+    parser.add_argument('--top', type=int, default=15, help="сколько самых медленных модулей показать")
+    args = parser.parse_args()
+    sys.exit(0 if check_startup_budget(args.budget, args.top) else 1)
+
+
+if __name__ == '__main__':
+    main()
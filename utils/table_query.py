@@ -0,0 +1,153 @@
+import json
+import math
+import operator
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache
+
+# Синтаксис filter_query у dash_table.DataTable (filter_action='custom')
+FILTER_OPERATORS = [
+    ['ge ', '>='],
+    ['le ', '<='],
+    ['lt ', '<'],
+    ['gt ', '>'],
+    ['ne ', '!='],
+    ['eq ', '='],
+    ['contains '],
+    ['datestartswith '],
+]
+
+COMPARISONS = {
+    'ge': operator.ge,
+    'le': operator.le,
+    'lt': operator.lt,
+    'gt': operator.gt,
+    'ne': operator.ne,
+    'eq': operator.eq,
+}
+
+# Порядок строк после фильтрации/сортировки: (dataset_id, sort_by, filter_query) -> позиции строк.
+# Перелистывание страниц берёт срез из готового порядка и не пересчитывает весь файл.
+_positions_cache = LRUCache(64, 512 * 1024 ** 2, lambda positions: positions.nbytes)
+
+
+def split_filter_part(filter_part):
+    """Разбирает одно условие вида '{col} op value' на (колонка, оператор, значение)."""
+    for operator_type in FILTER_OPERATORS:
+        for op in operator_type:
+            if op in filter_part:
+                name_part, value_part = filter_part.split(op, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if value_part and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + v0, v0)
+                elif operator_type[0] in ('contains ', 'datestartswith '):
+                    # Поиск по тексту: '1' не должно превращаться в '1.0'
+                    value = value_part
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def filter_mask(df: pd.DataFrame, filter_query: str):
+    """Булева маска строк по filter_query. None — фильтра нет."""
+    if not filter_query:
+        return None
+
+    mask = np.ones(len(df), dtype=bool)
+    for filter_part in filter_query.split(' && '):
+        col_name, op, value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+
+        column = df[col_name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # У неупорядоченных категорий нет операций < и >
+            column = column.astype(str)
+        if op in COMPARISONS:
+            if pd.api.types.is_numeric_dtype(column) and isinstance(value, str):
+                value = pd.to_numeric(value, errors='coerce')
+            elif pd.api.types.is_datetime64_any_dtype(column):
+                # Значение, не похожее на дату, не совпадает ни с одной строкой
+                value = pd.to_datetime(str(value).removesuffix('.0'), errors='coerce')
+            elif not pd.api.types.is_numeric_dtype(column) and not isinstance(value, str):
+                column = column.astype(str)
+                value = str(value).removesuffix('.0')
+            part = COMPARISONS[op](column, value)
+        elif op == 'contains':
+            part = column.astype(str).str.contains(str(value), regex=False, na=False)
+        elif op == 'datestartswith':
+            part = column.astype(str).str.startswith(str(value), na=False)
+        else:
+            continue
+
+        mask &= np.asarray(part.fillna(False) if isinstance(part, pd.Series) else part, dtype=bool)
+
+    return mask
+
+
+def query_positions(df: pd.DataFrame, sort_by, filter_query, row_mask=None):
+    """
+    Позиции строк после фильтрации и сортировки. None — исходный порядок всех строк.
+    row_mask — дополнительный отбор строк (перекрёстный фильтр графиков).
+    """
+    positions = None
+
+    mask = filter_mask(df, filter_query)
+    if row_mask is not None:
+        mask = row_mask if mask is None else mask & row_mask
+    if mask is not None:
+        positions = np.flatnonzero(mask)
+
+    sort_by = [s for s in (sort_by or []) if s['column_id'] in df.columns]
+    if sort_by:
+        cols = [s['column_id'] for s in sort_by]
+        frame = df[cols] if positions is None else df[cols].iloc[positions]
+        order = (frame.reset_index(drop=True)
+                 .sort_values(cols,
+                              ascending=[s['direction'] == 'asc' for s in sort_by],
+                              kind='stable',
+                              na_position='last')
+                 .index.to_numpy())
+        positions = order if positions is None else positions[order]
+
+    return positions
+
+
+def get_page(dataset_id, df: pd.DataFrame, page_current, page_size, sort_by=None, filter_query='',
+             row_mask=None, mask_key=''):
+    """
+    Возвращает строки одной страницы таблицы и количество страниц.
+    Без сортировки и фильтра стоимость — O(размер страницы).
+    row_mask и его ключ для кэша mask_key — перекрёстный фильтр графиков.
+    """
+    positions = None
+    if sort_by or filter_query or row_mask is not None:
+        key = (dataset_id, json.dumps(sort_by, sort_keys=True), filter_query, mask_key)
+        positions = _positions_cache.get(key)
+        if positions is None:
+            positions = query_positions(df, sort_by, filter_query, row_mask)
+            if positions is not None:
+                _positions_cache.put(key, positions)
+
+    n_rows = len(df) if positions is None else len(positions)
+    start = (page_current or 0) * page_size
+    end = start + page_size
+
+    if positions is None:
+        page = df.iloc[start:end]
+    else:
+        page = df.iloc[positions[start:end]]
+
+    page_count = max(math.ceil(n_rows / page_size), 1)
+    return page.to_dict('records'), page_count
@@ -0,0 +1,196 @@
+"""
+Загрузка больших файлов кусками в обход dcc.Upload.
+
+dcc.Upload передаёт файл целиком строкой base64 внутри JSON callback'а. Здесь файл
+отправляется браузером (assets/chunked_upload.js) кусками на эндпоинт Flask-сервера:
+
+    GET    /upload/<id>           сколько байт уже получено — с этого места загрузка продолжается
+    PUT    /upload/<id>           очередной кусок; заголовок Upload-Offset — его смещение в файле
+    POST   /upload/<id>/complete  файл получен целиком: разбор и кэширование, ответ — dataset_id
+    DELETE /upload/<id>           отмена загрузки
+
+Куски дописываются во временный файл, хэш содержимого считается по мере получения.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import jsonify, request
+
+import config
+from utils.data_processing import load_dataset_from_file
+from utils.dataset_cache import dataset_id_from_hasher, new_content_hasher
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+READ_BLOCK_BYTES = 1024 ** 2
+
+
+class UploadError(ValueError):
+    """Ошибка загрузки с HTTP-статусом для ответа клиенту."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class ChunkedUploads:
+    """
+    Незавершённые загрузки: файл <id>.part в directory и состояние хэша.
+    Хэш считается инкрементально, пока куски приходят по порядку; если состояние
+    потеряно (перезапуск сервера, другой воркер), файл перехэшируется при завершении.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._hashers = {}  # id -> (hasher, сколько байт учтено в хэше)
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadError("Некорректный идентификатор загрузки")
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks[upload_id]
+
+    def offset(self, upload_id) -> int:
+        path = self.path(upload_id)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def append(self, upload_id, offset, stream) -> int:
+        """Дописывает кусок из потока stream; offset должен совпадать с уже полученным размером."""
+        path = self.path(upload_id)
+        with self._upload_lock(upload_id):
+            current = self.offset(upload_id)
+            if offset != current:
+                raise UploadError("Смещение куска не совпадает с полученными данными", 409, current)
+            if current == 0:
+                self.prune_stale()
+
+            with self._lock:
+                hasher, hashed = self._hashers.get(upload_id, (new_content_hasher(), 0))
+            if hashed != current:
+                hasher = None  # хэш досчитаем при завершении
+
+            written = current
+            try:
+                with open(path, 'ab') as f:
+                    while True:
+                        block = stream.read(READ_BLOCK_BYTES)
+                        if not block:
+                            break
+                        written += len(block)
+                        if written > self.max_bytes:
+                            raise UploadError("Файл слишком большой", 413)
+                        f.write(block)
+                        if hasher is not None:
+                            hasher.update(block)
+            finally:
+                with self._lock:
+                    if hasher is not None:
+                        self._hashers[upload_id] = (hasher, os.path.getsize(path))
+                    else:
+                        self._hashers.pop(upload_id, None)
+            return os.path.getsize(path)
+
+    def finish(self, upload_id):
+        """Завершает загрузку. Возвращает (путь к файлу, dataset_id)."""
+        path = self.path(upload_id)
+        with self._upload_lock(upload_id):
+            if not os.path.exists(path):
+                raise UploadError("Загрузка не найдена", 404)
+            with self._lock:
+                hasher, hashed = self._hashers.pop(upload_id, (None, -1))
+            if hasher is None or hashed != os.path.getsize(path):
+                hasher = new_content_hasher()
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(READ_BLOCK_BYTES), b''):
+                        hasher.update(block)
+            return path, dataset_id_from_hasher(hasher)
+
+    def discard(self, upload_id):
+        path = self.path(upload_id)
+        with self._upload_lock(upload_id):
+            with self._lock:
+                self._hashers.pop(upload_id, None)
+                self._locks.pop(upload_id, None)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def prune_stale(self):
+        """Удаляет брошенные загрузки старше UPLOAD_STALE_SECONDS."""
+        deadline = time.time() - config.UPLOAD_STALE_SECONDS
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.part') and entry.stat().st_mtime < deadline:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+uploads = ChunkedUploads(config.UPLOAD_DIR, config.UPLOAD_MAX_BYTES)
+
+
+def _error_response(error: UploadError):
+    body = {'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+
+def register_upload_routes(app):
+    """Регистрирует эндпоинты загрузки кусками на Flask-сервере Dash-приложения."""
+    server = app.server
+    prefix = f"{app.config.routes_pathname_prefix}upload"
+
+    @server.route(f'{prefix}/<upload_id>', methods=['GET'])
+    def upload_status(upload_id):
+        try:
+            return jsonify({'offset': uploads.offset(upload_id)})
+        except UploadError as e:
+            return _error_response(e)
+
+    @server.route(f'{prefix}/<upload_id>', methods=['PUT'])
+    def upload_chunk(upload_id):
+        try:
+            offset = int(request.headers.get('Upload-Offset', '0'))
+            return jsonify({'offset': uploads.append(upload_id, offset, request.stream)})
+        except UploadError as e:
+            return _error_response(e)
+        except ValueError:
+            return jsonify({'error': "Некорректный заголовок Upload-Offset"}), 400
+
+    @server.route(f'{prefix}/<upload_id>/complete', methods=['POST'])
+    def upload_complete(upload_id):
+        filename = (request.get_json(silent=True) or {}).get('filename', '')
+        try:
+            path, dataset_id = uploads.finish(upload_id)
+            load_dataset_from_file(path, filename, dataset_id)
+        except UploadError as e:
+            return _error_response(e)
+        except ValueError as e:
+            uploads.discard(upload_id)
+            return jsonify({'error': str(e)}), 400
+
+        # Датасет уже в кэше и колоночном хранилище — исходный файл больше не нужен
+        uploads.discard(upload_id)
+        logger.info(f"Загрузка {upload_id} завершена: датасет {dataset_id}")
+        return jsonify({'dataset_id': dataset_id})
+
+    @server.route(f'{prefix}/<upload_id>', methods=['DELETE'])
+    def upload_cancel(upload_id):
+        try:
+            uploads.discard(upload_id)
+            return jsonify({'offset': 0})
+        except UploadError as e:
+            return _error_response(e)